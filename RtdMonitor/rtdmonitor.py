@@ -1,14 +1,13 @@
 """
 
-核心数据存储
+核心数据存储 RtdSeriesStore（列式）
 {
-    AxTitle: [          # 1个图
-        {
-            "index": ,          # x轴
-            "column": ,         # 项。list中含有n个column，则1个图中有n条折线
-            "value": ,          # y轴
+    AxTitle: {          # 1个图
+        column: {           # 项。dict中含有n个column，则1个图中有n条折线
+            index: [],          # x轴, numpy 数组
+            value: [],          # y轴, numpy 数组
         },
-    ],
+    },
 }
 
 
@@ -30,24 +29,37 @@ DataHandler分类
 """
 
 import os
+import io
 import shutil
 import sys
-from datetime import datetime, date, time
-from time import sleep
+import json
+import hashlib
+import locale
+import tempfile
+from datetime import datetime, date, time, timedelta
 import threading
 import logging
-from collections import defaultdict
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from dataclasses import dataclass
 
 from abc import ABC, abstractmethod
 
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.axes import Axes
+from matplotlib.lines import Line2D
 import matplotlib.dates as mdate
 
+# 可选, 用于监听文件夹变化（inotify / ReadDirectoryChangesW）；没有安装时使用轮询
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from RtdMonitor.rtdstore import RtdSeriesStore, RtdColumnBuffer, RtdRetentionPolicy
+from RtdMonitor.rtdserver import RtdHttpServer
 from RtdMonitor.helper.scheduler import ScheduleRunner
 from RtdMonitor.helper.simpleLogger import MyLogger
 
@@ -60,8 +72,37 @@ class RtdData:
 
 
 class RtdPlotterBase(ABC):
+    # 数据未变化时 是否仍然重新画图（例如 需要把曲线延伸到当前时间）
+    redraw_unchanged = False
+    title = 'RtdMonitor'
+    fig: plt.Figure
+
     def __init__(self, engine):
         self.engine = engine
+        # 画哪个 data_handler 的数据，由 engine 配对；为 None 时画 engine.data 中全部的 ax
+        self.data_handler: RtdDataHandlerBase or None = None
+        # 上一次画图时 data_handler 的数据版本号
+        self.plotted_data_version = -1
+
+    def _ax_names(self) -> List[str]:
+        if self.data_handler is None:
+            return sorted(self.engine.data.keys())
+        return sorted([_ for _ in self.data_handler.ax_names if _ in self.engine.data])
+
+    def _set_window_title(self, title):
+        self.title = title
+        # 新版本 matplotlib 中 canvas 没有 set_window_title；Agg 等非交互 backend 没有窗口
+        manager = getattr(self.fig.canvas, 'manager', None)
+        if manager is not None:
+            manager.set_window_title(title)
+        elif hasattr(self.fig.canvas, 'set_window_title'):
+            self.fig.canvas.set_window_title(title)
+
+    def render(self, fmt='png') -> bytes:
+        # 渲染当前的图
+        buf = io.BytesIO()
+        self.fig.savefig(buf, format=fmt)
+        return buf.getvalue()
 
     @abstractmethod
     def plot(self, *args):
@@ -77,6 +118,10 @@ class RtdPlotterBase(ABC):
 class RtdDataHandlerBase(ABC):
     def __init__(self, engine):
         self.engine = engine
+        # 同一个 engine 中的多个 handler 共用 engine.data，各自只管理自己写入的 ax
+        self.ax_names = set()
+        # 此 handler 的数据版本号，每次修改数据时 +1
+        self.data_version = 0
 
     @abstractmethod
     def handling(self, *args):
@@ -86,61 +131,213 @@ class RtdDataHandlerBase(ABC):
     def refresh_data(self, *args):
         pass
 
+    def on_task_start(self):
+        # 每次进入运行时间、任务线程启动前调用
+        pass
+
+    def close(self):
+        # engine 停止时调用，释放资源
+        pass
+
+    def on_plotter_paired(self, plotter: RtdPlotterBase):
+        # engine 配对 data_handler / plotter 后调用
+        pass
+
+    def _append(self, ax_name, column, index, value):
+        self.ax_names.add(ax_name)
+        self.engine.data.append(ax_name, column, index, value)
+
+    def _set_data_updated(self):
+        self.data_version += 1
+        self.engine.mark_data_updated()
+
+    def _clear_data(self):
+        # 只清空自己的 ax
+        self.engine.data.clear(self.ax_names)
+        self.ax_names = set()
+        self._set_data_updated()
+
 
 class RtdMonitorEngine(ScheduleRunner):
     """
+    一个 engine 可以包含多组 (data_handler, plotter)，共用同一个定时任务线程、同一个 data；
+    每次循环依次运行所有 data_handler，再重新画 数据有变化的 plotter。
+        add_view(data_handler, plotter)
+        或 add_data_handler / add_plotter，按添加的顺序配对
     """
     def __init__(
             self,
             running_time: list,  # ScheduleRunner
-            rtd_task_interval: int,
+            rtd_task_interval: float,       # 可以小于 1 秒
             # data_handler: RtdDataHandlerBase,
             # plotter: RtdPlotterBase,
             refresh_data_in_task_start: bool = False,     # 是否在（重新）启动任务时重新刷新 数据
             logger=MyLogger('RtdMonitor'),
+            headless: bool = False,         # 不打开窗口，使用 Agg 渲染
+            output_dir: str = '',           # headless, 每次画图后输出 {title}.png / .svg / .json 到此文件夹
+            image_formats=('png',),         # headless, 渲染的图片格式
+            http_port: int or None = None,  # headless, 在本地 http 端口提供最新的图片和数据
+            http_host='127.0.0.1',
+            session_provider=None,          # ScheduleRunner, 例如 TradingCalendar.sessions_on，代替 running_time
     ):
         # 定时任务骑
         super(RtdMonitorEngine, self).__init__(
-            running_time=running_time, schedule_checking_interval=rtd_task_interval, logger=logger)
-        self.task_interval = int(rtd_task_interval)
+            running_time=running_time, schedule_checking_interval=rtd_task_interval, logger=logger,
+            session_provider=session_provider)
+        self.task_interval = float(rtd_task_interval)
 
         # 作为 data_handler / plotter
         """
         核心数据存储
         {
-            AxTitle: [          # 1个图
-                {
-                    "index": ,          # x轴
-                    "column": ,         # 项。list中含有n个column，则1个图中有n条折线
-                    "value": ,          # y轴
-                }, 
-            ],
+            AxTitle: {          # 1个图
+                column: RtdColumnBuffer,        # 1条折线, index / value
+            },
         }
         """
-        self.data: Dict[str, List[RtdData]] = defaultdict(list)
+        self.data: RtdSeriesStore = RtdSeriesStore()
         self.is_data_updated = True
+        # data 的版本号，data_handler 每次修改 data 时 +1；
+        # 与上一次画图时的版本号相同，说明数据没有变化，跳过画图
+        self.data_version = 0
         # 数据处理
-        self.data_handler: RtdDataHandlerBase
+        self.data_handlers: List[RtdDataHandlerBase] = []
         # 画图
-        self.plotter: RtdPlotterBase
+        self.plotters: List[RtdPlotterBase] = []
 
         #
         self._refresh_data_in_task_start = refresh_data_in_task_start
         self._task_processing_thread: None or threading.Thread = None
 
+        # headless
+        self.headless = headless
+        self._output_dir = output_dir
+        self._image_formats = list(image_formats)
+        self._http_port = http_port
+        self._http_host = http_host
+        self._http_server: RtdHttpServer or None = None
+        # 最新一帧 {plotter title: {格式: bytes}}（包括该 plotter 数据的 json）, 全部数据的 json
+        self._frame_lock = threading.Lock()
+        self.frames: Dict[str, Dict[str, bytes]] = {}
+        self.data_json: bytes = b'{}'
+        self.frame_version = 0
+        if headless:
+            # 需要在 plotter 创建 figure 之前切换
+            plt.switch_backend('Agg')
+            if output_dir and not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+
+    def add_view(self, data_handler: RtdDataHandlerBase, plotter: RtdPlotterBase):
+        self.data_handlers.append(data_handler)
+        self.plotters.append(plotter)
+        self._pair(data_handler, plotter)
+
     def add_data_handler(self, data_handler):
-        self.data_handler: RtdDataHandlerBase = data_handler
+        self.data_handlers.append(data_handler)
+        self._pair_views()
 
     def add_plotter(self, plotter):
-        self.plotter: RtdPlotterBase = plotter
+        self.plotters.append(plotter)
+        self._pair_views()
+
+    def _pair_views(self):
+        # 按添加的顺序配对
+        for _data_handler, _plotter in zip(self.data_handlers, self.plotters):
+            if _plotter.data_handler is not _data_handler:
+                self._pair(_data_handler, _plotter)
+
+    @staticmethod
+    def _pair(data_handler: RtdDataHandlerBase, plotter: RtdPlotterBase):
+        plotter.data_handler = data_handler
+        data_handler.on_plotter_paired(plotter)
+
+    @property
+    def data_handler(self) -> RtdDataHandlerBase:
+        return self.data_handlers[0]
+
+    @property
+    def plotter(self) -> RtdPlotterBase:
+        return self.plotters[0]
+
+    def mark_data_updated(self):
+        # data_handler 修改 data 后调用
+        self.data_version += 1
+        self.is_data_updated = True
 
     def start(self):
         self._scheduler_guard_thread.start()
-        self.plotter.plot()
+        if not self.headless:
+            # plt.show() 显示所有的 figure
+            self.plotters[0].plot()
+            return
+        # headless, 阻塞到 stop()
+        if self._http_port:
+            self._http_server = RtdHttpServer(
+                self, host=self._http_host, port=self._http_port, refresh_seconds=max(int(self.task_interval), 1))
+            self._http_server.start()
+        self._scheduler_guard_thread.join()
+
+    def stop(self):
+        super(RtdMonitorEngine, self).stop()
+        # 等待调度线程结束运行（结束任务线程），再释放 handler 的资源
+        if self._scheduler_guard_thread.is_alive() and threading.current_thread() is not self._scheduler_guard_thread:
+            self._scheduler_guard_thread.join()
+        if self._http_server is not None:
+            self._http_server.shutdown()
+            self._http_server = None
+        for _data_handler in self.data_handlers:
+            try:
+                _data_handler.close()
+            except Exception as e:
+                self.logger.error(f'{type(_data_handler).__name__} close error: {e}')
+
+    def get_frame(self) -> (int, Dict[str, Dict[str, bytes]], bytes):
+        """ return frame_version, frames, data_json """
+        with self._frame_lock:
+            return self.frame_version, self.frames, self.data_json
+
+    def _gen_data_json(self, ax_names=None) -> bytes:
+        return json.dumps({
+            'version': self.data_version,
+            'datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'data': self.data.to_dict(ax_names),
+        }).encode('utf-8')
+
+    def _publish_frames(self, l_plotters: List[RtdPlotterBase]):
+        # 在任务线程中运行：渲染重新画过的 plotter、序列化数据，供 http / 文件 使用
+        frames = dict(self.frames)
+        for _plotter in l_plotters:
+            _d_frame = {_fmt: _plotter.render(_fmt) for _fmt in self._image_formats}
+            _d_frame['json'] = self._gen_data_json(_plotter._ax_names())
+            frames[_plotter.title] = _d_frame
+        data_json = self._gen_data_json()
+        with self._frame_lock:
+            self.frames = frames
+            self.data_json = data_json
+            self.frame_version += 1
+        if self._output_dir:
+            for _plotter in l_plotters:
+                for _fmt, _content in frames[_plotter.title].items():
+                    self._write_file(os.path.join(self._output_dir, f'{_plotter.title}.{_fmt}'), _content)
+
+    @staticmethod
+    def _write_file(p, content: bytes):
+        # 先写临时文件再替换，查看程序不会读到写了一半的图片
+        fd, p_tmp = tempfile.mkstemp(dir=os.path.dirname(p), prefix='.' + os.path.basename(p), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+            os.replace(p_tmp, p)
+        except Exception:
+            if os.path.exists(p_tmp):
+                os.remove(p_tmp)
+            raise
 
     def _start_task(self):
-        if self._refresh_data_in_task_start:
-            self.data_handler.refresh_data()
+        for _data_handler in self.data_handlers:
+            if self._refresh_data_in_task_start:
+                _data_handler.refresh_data()
+            _data_handler.on_task_start()
         self._task_processing_thread = threading.Thread(target=self._task_processing_loop)
         self._task_processing_thread.start()
 
@@ -154,12 +351,32 @@ class RtdMonitorEngine(ScheduleRunner):
 
     def _task_processing_loop(self):
         while self.schedule_in_running:
-            # 数据读取 处理，转换成画图的数据
-            self.data_handler.handling()
-            # 更新plotter画图数据
-            self.plotter.update()
-            # 间隔
-            sleep(self.task_interval)
+            # 数据读取 处理，转换成画图的数据; 一个 handler 出错不影响其他
+            for _data_handler in self.data_handlers:
+                try:
+                    _data_handler.handling()
+                except Exception as e:
+                    self.logger.error(f'{type(_data_handler).__name__} handling error: {e}')
+            # 更新plotter画图数据, 数据没有变化时不重新画图
+            l_updated_plotters = []
+            for _plotter in self.plotters:
+                _version = _plotter.data_handler.data_version if _plotter.data_handler else self.data_version
+                if _version == _plotter.plotted_data_version and not _plotter.redraw_unchanged:
+                    continue
+                _plotter.plotted_data_version = _version
+                try:
+                    _plotter.update()
+                except Exception as e:
+                    self.logger.error(f'{_plotter.title} plotting error: {e}')
+                    continue
+                l_updated_plotters.append(_plotter)
+            self.is_data_updated = False
+            if not l_updated_plotters:
+                self.logger.info('data unchanged, skip plotting')
+            elif self.headless:
+                self._publish_frames(l_updated_plotters)
+            # 间隔, 运行时间结束时立即返回
+            self.wait(self.task_interval)
 
 
 # ===========================
@@ -193,8 +410,16 @@ class RtdTimeSeriesDataHandler(RtdDataHandlerBase):
     data 中
     不保存所有数据，只保留value发生变化时的数据
 
+    tail_follow=True 时（默认）
+        记录每个文件已读取的字节位置，每次只读取新增的字节（只消费完整的行）；
+        根目录 / 日期目录 的 mtime 没有变化时不 listdir，只 stat 仍在写入的（最新的）文件；
+        有更新的文件出现后，之前的文件视为已写完，不再检查。
+        use_inotify=True 且安装了 watchdog 时，文件夹没有变化事件就直接跳过，不做任何 stat。
+    tail_follow=False 时，每次 listdir，按文件名读取整个新文件。
 
-
+    retention 不为 None 时，每次读取新数据后按 RtdRetentionPolicy 抽稀旧数据，
+    全天（包括夜盘）运行时 data 的内存和画图的点数都有上限；
+    与 plotter 配对后，保留的点数按 plotter 子图的像素宽度计算。
     """
     def __init__(
             self,
@@ -203,6 +428,9 @@ class RtdTimeSeriesDataHandler(RtdDataHandlerBase):
             all_in_one_ax_name="",
             refresh_data_in_new_date=True,      # 新日期，重置数据
             only_changed_data=True,     # 仅读取存储，value发生变化的数据，避免时间序列中有过多无用数据
+            tail_follow=True,           # 按字节位置 增量读取
+            use_inotify=False,          # 监听文件夹变化事件，需要 watchdog
+            retention: RtdRetentionPolicy or None = None,       # 旧数据抽稀
     ):
         super(RtdTimeSeriesDataHandler, self).__init__(engine)
 
@@ -210,12 +438,135 @@ class RtdTimeSeriesDataHandler(RtdDataHandlerBase):
         self._refresh_data_in_new_date = refresh_data_in_new_date
         self._only_changed_data = only_changed_data
         self._all_in_one_ax_name = all_in_one_ax_name
+        self._tail_follow = tail_follow
+        self._retention = retention
 
         # 初始化
         self._last_reading_file = ''
         self._last_reading_date = ''
+        # tail follow: {file_name: (已读取的字节位置, 上一次检查时的文件大小)}, 仅包含仍在写入的文件
+        self._d_file_offsets: Dict[str, Tuple[int, int]] = {}
+        self._root_mtime = None
+        self._date_folder_mtime = None
+        # 为 True 时不管是否有文件夹变化事件，都重新检查一次
+        self._force_rescan = True
+
+        self._watcher: _FolderWatcher or None = None
+        if tail_follow and use_inotify:
+            if Observer is None:
+                self.engine.logger.warning('watchdog is not installed, polling the data folder')
+            else:
+                self._watcher = _FolderWatcher(path_root)
 
     def handling(self):
+        _data_version = self.data_version
+        if self._tail_follow:
+            self._handling_tail_follow()
+        else:
+            self._handling_listdir()
+        # 有新数据时，抽稀旧数据
+        if self._retention is not None and self.data_version != _data_version:
+            if self.engine.data.apply_retention(self._retention, self.ax_names):
+                self._set_data_updated()
+
+    def on_task_start(self):
+        # 运行时间之外（或 watcher 启动之前）的文件变化没有事件，重新检查一次
+        self._force_rescan = True
+
+    def on_plotter_paired(self, plotter: RtdPlotterBase):
+        # 抽稀后的点数跟随子图宽度
+        if self._retention is not None:
+            self._retention.attach_axes(plotter.fig.axes)
+
+    def close(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def _handling_tail_follow(self):
+        # 先清除事件，检查过程中的新事件留到下一次
+        _is_changed = self._watcher.pop_changed() if self._watcher is not None else True
+        if not (_is_changed or self._force_rescan):
+            return
+        self.engine.logger.info('handling new data')
+        # [1] 根目录变化时，查找最新的文件夹
+        _root_mtime = os.stat(self.path_root).st_mtime_ns
+        if _root_mtime != self._root_mtime:
+            self._root_mtime = _root_mtime
+            newest_date_folder_name = max([
+                i for i in os.listdir(self.path_root)
+                if os.path.isdir(os.path.join(self.path_root, i))
+            ])
+            if newest_date_folder_name != self._last_reading_date:
+                if self._refresh_data_in_new_date:
+                    self.refresh_data()
+                self._reset_reading_state()
+                self._root_mtime = _root_mtime
+                self._last_reading_date = newest_date_folder_name
+        # 新日期 重置读取状态 也在本次检查中完成
+        self._force_rescan = False
+        path_date_folder = os.path.join(self.path_root, self._last_reading_date)
+
+        # [2] 日期目录变化时，查找新的文件
+        _date_folder_mtime = os.stat(path_date_folder).st_mtime_ns
+        if _date_folder_mtime != self._date_folder_mtime:
+            self._date_folder_mtime = _date_folder_mtime
+            for file_name in os.listdir(path_date_folder):
+                if file_name > self._last_reading_file and file_name not in self._d_file_offsets:
+                    self._d_file_offsets[file_name] = (0, -1)
+
+        # [3] 读取新增的字节
+        l_file_names = sorted(self._d_file_offsets.keys())
+        _is_updated = False
+        for n, file_name in enumerate(l_file_names):
+            # 已经有更新的文件，此文件不会再写入
+            _is_finished = n < len(l_file_names) - 1
+            try:
+                l_lines = self._read_new_lines(os.path.join(path_date_folder, file_name), file_name, _is_finished)
+            except Exception as e:
+                self.engine.logger.error(e)
+                raise Exception
+            if l_lines and self._handle_lines(l_lines):
+                _is_updated = True
+        if _is_updated:
+            self._set_data_updated()
+
+    def _read_new_lines(self, p, file_name, is_finished) -> List[str]:
+        offset, last_size = self._d_file_offsets[file_name]
+        size = os.path.getsize(p)
+        if size < offset:
+            # 文件被重写
+            offset, last_size = 0, -1
+        content = b''
+        if size > offset:
+            with open(p, 'rb') as f:
+                f.seek(offset)
+                content = f.read(size - offset)
+        # 只消费完整的行；文件已写完 或 大小不再变化时，末尾没有换行符的一行也是完整的
+        if is_finished or size == last_size:
+            _n_end = len(content)
+        else:
+            _n_end = content.rfind(b'\n') + 1
+        offset += _n_end
+        if is_finished and offset >= size:
+            self._d_file_offsets.pop(file_name)
+            self._last_reading_file = max(self._last_reading_file, file_name)
+        else:
+            self._d_file_offsets[file_name] = (offset, size)
+        if not _n_end:
+            return []
+        return content[:_n_end].decode(locale.getpreferredencoding(False)).splitlines()
+
+    def _reset_reading_state(self):
+        self._last_reading_file = ''
+        self._last_reading_date = ''
+        self._d_file_offsets = {}
+        self._root_mtime = None
+        self._date_folder_mtime = None
+        # 已读取的状态被清空，需要重新读取全部文件
+        self._force_rescan = True
+
+    def _handling_listdir(self):
         self.engine.logger.info('handling new data')
         # [1] 查找最新的文件夹
         _is_new_date = False
@@ -246,9 +597,14 @@ class RtdTimeSeriesDataHandler(RtdDataHandlerBase):
 
     def _read_a_file(self, p):
         # [3] 读取新文件
-        self._set_data_unupdated()
         with open(p) as f:
             l_lines = f.readlines()
+        if self._handle_lines(l_lines):
+            self._set_data_updated()
+
+    def _handle_lines(self, l_lines: List[str]) -> bool:
+        """ return 是否添加了新数据 """
+        _is_updated = False
         for line in l_lines:
             line = line.strip()
             if line == '':
@@ -263,40 +619,50 @@ class RtdTimeSeriesDataHandler(RtdDataHandlerBase):
             )
             # 只在 value 发生变化是添加新数据
             if self._only_changed_data:
-                if not self._all_in_one_ax_name:
-                    _data_in_column = self.engine.data.get(column_name)
-                else:
-                    _data_in_column = [
-                        i for i in self.engine.data[self._all_in_one_ax_name]
-                        if i.column == column_name
-                    ]
-                if not _data_in_column:
-                    # 新增 symbol
-                    self._append_new_data(new_data)
-                    self._set_data_updated()
-                elif value != max(_data_in_column, key=lambda x: x.index).value:
-                    # 信号改变, 添加
-                    self._append_new_data(new_data)
-                    self._set_data_updated()
-            else:
-                self._append_new_data(new_data)
-                self._set_data_updated()
+                # column 的最新值, O(1); None 为新增 symbol
+                _last_value = self.engine.data.last_value(self._ax_name(column_name), column_name)
+                if _last_value is not None and value == _last_value:
+                    continue
+            self._append_new_data(new_data)
+            _is_updated = True
+        return _is_updated
+
+    def _ax_name(self, column_name) -> str:
+        return self._all_in_one_ax_name if self._all_in_one_ax_name else column_name
 
     def _append_new_data(self, data: RtdData):
-        if not self._all_in_one_ax_name:
-            self.engine.data[data.column].append(data)
-        else:
-            self.engine.data[self._all_in_one_ax_name].append(data)
+        self._append(self._ax_name(data.column), data.column, data.index, data.value)
 
-    def _set_data_updated(self):
-        self.engine.is_data_updated = True
+    def refresh_data(self):
+        self._clear_data()
+        # 数据已清空，需要重新读取全部文件
+        self._reset_reading_state()
 
-    def _set_data_unupdated(self):
-        self.engine.is_data_updated = False
 
-    def refresh_data(self):
-        self.engine.data = defaultdict(list)
-        self.engine.is_data_updated = True
+class _FolderWatcher(FileSystemEventHandler):
+    """ 监听 path_root 下（包括子目录）的文件变化 """
+    def __init__(self, path_root):
+        super(_FolderWatcher, self).__init__()
+        self._changed = threading.Event()
+        self._changed.set()
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._observer.schedule(self, path_root, recursive=True)
+        self._observer.start()
+
+    def on_any_event(self, event):
+        self._changed.set()
+
+    def pop_changed(self) -> bool:
+        # 事件在读取之前清除，读取过程中的新事件会留到下一次
+        if not self._changed.is_set():
+            return False
+        self._changed.clear()
+        return True
+
+    def stop(self):
+        self._observer.stop()
+        self._observer.join()
 
 
 class RtdTimeSeriesPlotter(RtdPlotterBase):
@@ -305,15 +671,27 @@ class RtdTimeSeriesPlotter(RtdPlotterBase):
     2，实现画图功能，
     3，画图并展示，   plt.show()
     1，持续接收画图信息，并在信息变更后立即重新再画。   plt.draw()
+
+    reuse_artists=True 时，每个 (ax, column) 只创建一条 Line2D，之后用 set_data 更新数据，
+    坐标轴范围、y轴刻度只在超出当前范围时重新计算；
+    只有数据更新（没有新增 ax / column，坐标轴不变）时，backend 支持的情况下用 blit 只重画曲线；
+    交互式 backend 不是线程安全的，blit 不在任务线程中运行：任务线程只标记，由 GUI 线程中的定时器执行；
+    任务线程更新曲线（_d_lines, set_data）与 GUI 线程画曲线 之间用 _lines_lock 互斥，不会画到更新了一半的曲线。
+    reuse_artists=False 时，每次 clear 后重新画全部子图。
     """
     def __init__(
             self,
             engine,
             nrows, ncols, title,
             add_now_dt_tick=True,
+            reuse_artists=True,
+            use_blit=True,
     ):
         super(RtdTimeSeriesPlotter, self).__init__(engine=engine)
         self._add_now_dt_tick = add_now_dt_tick
+        # 曲线需要延伸到当前时间，数据不变时也要重新画
+        self.redraw_unchanged = add_now_dt_tick
+        self._reuse_artists = reuse_artists
 
         self._plotting_thread: None or threading.Thread = None
 
@@ -327,7 +705,7 @@ class RtdTimeSeriesPlotter(RtdPlotterBase):
             bottom=0.06, top=0.95,
             wspace=0.18, hspace=0.3
         )  # 设置子图之间的间距
-        self.fig.canvas.set_window_title(title)  # 设置窗口标题
+        self._set_window_title(title)  # 设置窗口标题
 
         # 子图字典，key为子图的序号，value为子图句柄
         self._ax_list: List[Axes] = []
@@ -342,6 +720,26 @@ class RtdTimeSeriesPlotter(RtdPlotterBase):
                 for j in range(ncols):
                     self._ax_list.append(self.axs[i, j])
 
+        # 已创建的画图元素
+        self._d_ax_names: Dict[int, str] = {}                      # {ax 序号: ax_name}
+        self._d_lines: Dict[Tuple[int, str], Line2D] = {}         # {(ax 序号, column): Line2D}
+        self._d_ax_y_max: Dict[int, float] = {}                   # y轴刻度对应的 最大绝对值
+        self._d_ax_x_lim: Dict[int, Tuple[datetime, datetime]] = {}
+        # 任务线程（update）与 GUI 线程（_draw_lines）之间
+        self._lines_lock = threading.RLock()
+        # blit
+        # headless 时每次都要完整渲染，blit 没有意义
+        self._use_blit = reuse_artists and use_blit and not engine.headless \
+            and getattr(self.fig.canvas, 'supports_blit', False)
+        self._background = None
+        self._blit_pending = threading.Event()
+        if self._use_blit:
+            self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+            # 在创建 figure 的 GUI 线程中运行
+            self._blit_timer = self.fig.canvas.new_timer(interval=100)
+            self._blit_timer.add_callback(self._on_blit_timer)
+            self._blit_timer.start()
+
     @staticmethod
     def _cal_fig_size(nrows, ncols):
         row_size = 3 * nrows
@@ -353,38 +751,162 @@ class RtdTimeSeriesPlotter(RtdPlotterBase):
         plt.show()
 
     def update(self):
+        if not self._reuse_artists:
+            self._update_by_redraw()
+            return
         self.engine.logger.info('plotting new data')
-        l_ax_names = list(self.engine.data.keys())
-        l_ax_names.sort()
+        with self._lines_lock:
+            _need_full_draw = self._update_artists()
+        if _need_full_draw or not self._use_blit:
+            self.fig.canvas.draw_idle()
+        else:
+            # 由 GUI 线程的定时器 blit
+            self._blit_pending.set()
+
+    def _update_artists(self) -> bool:
+        """ 更新曲线和坐标轴，return 是否需要完整重画 """
+        l_ax_names = self._ax_names()
+        _need_full_draw = False
         for n, ax_name in enumerate(l_ax_names):
-            ax_data: List[RtdData] = self.engine.data[ax_name]
-            ax_data_column_name = list(set([i.column for i in ax_data]))
+            ax = self._ax_list[n]
+            if self._d_ax_names.get(n) != ax_name:
+                self._reset_ax(n, ax_name)
+                _need_full_draw = True
+            d_column_xy = self._gen_column_xy(self.engine.data.columns(ax_name))
+            if not d_column_xy:
+                continue
+
+            # 更新曲线
+            for column_name, (x, y) in d_column_xy.items():
+                line = self._d_lines.get((n, column_name))
+                if line is None:
+                    line, = ax.plot(x, y, drawstyle='steps-post', animated=self._use_blit)
+                    self._d_lines[(n, column_name)] = line
+                    _need_full_draw = True
+                else:
+                    line.set_data(x, y)
+            # 已经不存在的 column（例如 新日期 刷新数据后）
+            for _key in [_ for _ in self._d_lines.keys() if _[0] == n and _[1] not in d_column_xy]:
+                self._d_lines.pop(_key).remove()
+                _need_full_draw = True
+
+            if self._update_limits(n, d_column_xy):
+                _need_full_draw = True
+
+        # 多出来的 ax（ax 数量减少）
+        for n in [_ for _ in self._d_ax_names.keys() if _ >= len(l_ax_names)]:
+            self._reset_ax(n, '')
+            self._d_ax_names.pop(n)
+            _need_full_draw = True
+        return _need_full_draw
+
+    def _reset_ax(self, n, ax_name):
+        # 子图 改为显示另一个 ax_name，清空原有的曲线
+        for _key in [_ for _ in self._d_lines.keys() if _[0] == n]:
+            self._d_lines.pop(_key)
+        self._d_ax_y_max.pop(n, None)
+        self._d_ax_x_lim.pop(n, None)
+
+        ax = self._ax_list[n]
+        ax.clear()
+        self._d_ax_names[n] = ax_name
+        if not ax_name:
+            return
+        ax.set_title(ax_name, fontsize=8)
+        ax.xaxis.set_major_formatter(mdate.DateFormatter('%H:%M'))
+        ax.tick_params(
+            labelsize=6,
+            labelrotation=15
+        )
+
+    def _gen_column_xy(self, d_columns: Dict[str, RtdColumnBuffer]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        dt_now = datetime.now()
+        d_column_xy = {}
+        for column_name, _buffer in d_columns.items():
+            if not len(_buffer):
+                continue
+            x, y = _buffer.sorted_data()
+            if self._add_now_dt_tick:
+                x = np.append(x, dt_now)
+                y = np.append(y, y[-1])
+            d_column_xy[column_name] = (x, y)
+        return d_column_xy
+
+    def _update_limits(self, n, d_column_xy: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> bool:
+        """ 坐标轴范围 超出时才重新计算，return 是否修改 """
+        ax = self._ax_list[n]
+        _is_changed = False
+        # y轴
+        _y_max = float(max([np.max(np.abs(y)) for x, y in d_column_xy.values()]))
+        if _y_max != self._d_ax_y_max.get(n):
+            self._d_ax_y_max[n] = _y_max
+            y_ticks = self._cal_y_ticks(_y_max, 7)
+            ax.set_yticks(y_ticks)
+            ax.set_ylim(y_ticks[0], y_ticks[-1])
+            _is_changed = True
+        # x轴, 右侧预留一段，避免每次延伸到当前时间都要重新计算
+        _x_min = min([x[0] for x, y in d_column_xy.values()])
+        _x_max = max([x[-1] for x, y in d_column_xy.values()])
+        x_lim = self._d_ax_x_lim.get(n)
+        if x_lim is None or _x_min < x_lim[0] or _x_max > x_lim[1]:
+            x_lim = (_x_min, _x_max + max((_x_max - _x_min) * 0.1, timedelta(minutes=5)))
+            self._d_ax_x_lim[n] = x_lim
+            ax.set_xlim(x_lim)
+            _is_changed = True
+        return _is_changed
+
+    def _on_draw(self, event):
+        # 完整重画后（包括窗口缩放），保存不含曲线的背景，再画上曲线
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        with self._lines_lock:
+            for line in list(self._d_lines.values()):
+                if line.axes is not None:
+                    line.axes.draw_artist(line)
+
+    def _on_blit_timer(self):
+        if not self._blit_pending.is_set():
+            return
+        self._blit_pending.clear()
+        self._blit()
+
+    def _blit(self):
+        # 只在 GUI 线程中调用
+        if self._background is None:
+            self.fig.canvas.draw_idle()
+            return
+        self.fig.canvas.restore_region(self._background)
+        self._draw_lines()
+        self.fig.canvas.blit(self.fig.bbox)
+        self.fig.canvas.flush_events()
+
+    def _update_by_redraw(self):
+        self.engine.logger.info('plotting new data')
+        l_ax_names = self._ax_names()
+        for n, ax_name in enumerate(l_ax_names):
+            d_column_xy = self._gen_column_xy(self.engine.data.columns(ax_name))
             #
             self._ax_list[n].clear()  # 清空子图数据
             self._ax_list[n].set_title(ax_name, fontsize=8)
+            if not d_column_xy:
+                continue
 
             # 添加曲线
-            for column_name in ax_data_column_name:
-                ax_data_of_column = [i for i in ax_data if i.column == column_name]
-                ax_data_of_column.sort(key=lambda x: x.index)
-                x = [i.index for i in ax_data_of_column]
-                y = [i.value for i in ax_data_of_column]
-                if self._add_now_dt_tick:
-                    x.append(datetime.now())
-                    y.append(y[-1])
+            for column_name, (x, y) in d_column_xy.items():
                 self._ax_list[n].step(x, y, where="post")  # 绘制最新的数据
 
             # 设置
-            y_of_ax = [i.value for i in ax_data]
             self._ax_list[n].set_yticks(
-                self._cal_y_ticks(max(abs(max(y_of_ax)), abs(min(y_of_ax))), 7)
+                self._cal_y_ticks(float(max([np.max(np.abs(y)) for x, y in d_column_xy.values()])), 7)
             )
             self._ax_list[n].xaxis.set_major_formatter(mdate.DateFormatter('%H:%M'))
             self._ax_list[n].tick_params(
                 labelsize=6,
                 labelrotation=15
             )
-            plt.draw()
+            self.fig.canvas.draw_idle()
 
     @staticmethod
     def _cal_y_ticks(_max, n) -> list:
@@ -421,14 +943,20 @@ class RtdSingleFileDataHandler(RtdDataHandlerBase):
         super(RtdSingleFileDataHandler, self).__init__(engine=engine)
         self._file_path = file_path
         self._all_in_one_ax_name = all_in_one_ax_name
+        # 上一次读取的文件内容 hash，文件内容没有变化时不重新解析
+        self._last_file_hash = None
 
     def handling(self):
         self.engine.logger.info('handling new data')
+        with open(self._file_path, 'rb') as f:
+            content = f.read()
+        _file_hash = hashlib.md5(content).hexdigest()
+        if _file_hash == self._last_file_hash:
+            return
+
         self.refresh_data()
-        self._set_data_unupdated()
-        with open(self._file_path) as f:
-            l_lines = f.readlines()
-        for line in l_lines:
+        self._last_file_hash = _file_hash
+        for line in content.decode(locale.getpreferredencoding(False)).splitlines():
             line = line.strip()
             if line == '':
                 continue
@@ -443,20 +971,12 @@ class RtdSingleFileDataHandler(RtdDataHandlerBase):
         self._set_data_updated()
 
     def _append_new_data(self, data: RtdData):
-        if not self._all_in_one_ax_name:
-            self.engine.data[data.column].append(data)
-        else:
-            self.engine.data[self._all_in_one_ax_name].append(data)
-
-    def _set_data_updated(self):
-        self.engine.is_data_updated = True
-
-    def _set_data_unupdated(self):
-        self.engine.is_data_updated = False
+        ax_name = self._all_in_one_ax_name if self._all_in_one_ax_name else data.column
+        self._append(ax_name, data.column, data.index, data.value)
 
     def refresh_data(self):
-        self.engine.data = defaultdict(list)
-        self.engine.is_data_updated = True
+        self._clear_data()
+        self._last_file_hash = None
 
 
 class RtdCommonPlotter(RtdPlotterBase):
@@ -487,7 +1007,7 @@ class RtdCommonPlotter(RtdPlotterBase):
             bottom=0.06, top=0.95,
             wspace=0.18, hspace=0.3
         )  # 设置子图之间的间距
-        self.fig.canvas.set_window_title(title)  # 设置窗口标题
+        self._set_window_title(title)  # 设置窗口标题
 
         # 子图字典，key为子图的序号，value为子图句柄
         self._ax_list: List[Axes] = []
@@ -516,22 +1036,21 @@ class RtdCommonPlotter(RtdPlotterBase):
 
     def update(self):
         self.engine.logger.info('plotting new data')
-        l_ax_names = list(self.engine.data.keys())
-        l_ax_names.sort()
+        l_ax_names = self._ax_names()
         for n, ax_name in enumerate(l_ax_names):
             #
             self._ax_list[n].clear()  # 清空子图数据
             self._ax_list[n].set_title(ax_name, fontsize=8)
 
             # 数据处理
-            df = pd.DataFrame(self.engine.data[ax_name])
+            df = self.engine.data.to_frame(ax_name)
             df = df.pivot_table(values='value', index='index', columns='column', aggfunc='sum')
             df = df.fillna(0)  # 补零
             df = df.loc[(df != 0).any(axis=1), :]  # 去除volume 全是0的 ticker
 
             l_column_names = df.columns.to_list()
-            max_value = max(np.max(df))
-            min_value = min(np.min(df))
+            max_value = df.max().max()
+            min_value = df.min().min()
 
             # 按照 Ticker 量排序
             if self._sort_by_column_name not in l_column_names:
@@ -550,9 +1069,9 @@ class RtdCommonPlotter(RtdPlotterBase):
             # ax.set_xticks(all_tickers)
             self._ax_list[n].set_xticklabels(l_index_sorted_by_value, rotation=90, fontsize=10)
             self._ax_list[n].set_ylim((min_value, max_value), )
-            # 图例
-            plt.legend(bbox_to_anchor=(1.05, 1.0), loc='upper left')
-            plt.tight_layout()
+            # 图例; 同一进程中有多个 figure，不使用 plt 的当前 figure
+            self._ax_list[n].legend(bbox_to_anchor=(1.05, 1.0), loc='upper left')
+            self.fig.tight_layout()
             # 网格
-            plt.grid(True, linestyle='--')
-            plt.draw()
+            self._ax_list[n].grid(True, linestyle='--')
+            self.fig.canvas.draw_idle()
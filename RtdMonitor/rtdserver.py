@@ -0,0 +1,107 @@
+"""
+headless 模式下，通过本地 http 提供 RtdMonitorEngine 最新的画图和数据
+
+    /                   自动刷新的页面，显示所有 plotter 的最新一帧
+    /{title}.png        plotter 的最新一帧（格式需要在 engine 的 image_formats 中）
+    /{title}.svg
+    /{title}.json       plotter 的画图数据
+    /frame.png          第一个 plotter 的最新一帧
+    /data.json          全部画图数据 {"version": , "datetime": , "data": {AxTitle: {column: {"index": [], "value": []}}}}
+
+一个渲染进程可以供多个浏览器查看；
+响应带 ETag（数据版本号），浏览器重复请求同一版本时返回 304，不重复传输。
+"""
+
+import threading
+from urllib.parse import quote, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'json': 'application/json',
+    'html': 'text/html; charset=utf-8',
+}
+
+
+class RtdHttpServer:
+    def __init__(self, engine, host='127.0.0.1', port=8050, refresh_seconds=5):
+        self.engine = engine
+        self._refresh_seconds = refresh_seconds
+        self._server = ThreadingHTTPServer((host, port), self._gen_request_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread or None = None
+
+    def _gen_request_handler(self):
+        server = self
+
+        class _RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle_get(self)
+
+            def log_message(self, format, *args):
+                server.engine.logger.debug(format % args)
+
+        return _RequestHandler
+
+    def _page(self, frames: dict) -> bytes:
+        l_img = []
+        for _title, _d_frame in frames.items():
+            l_formats = [_ for _ in _d_frame.keys() if _ != 'json']
+            if l_formats:
+                l_img.append(f'<img src="/{quote(_title)}.{l_formats[0]}">')
+        return (
+            '<html><head>'
+            f'<meta http-equiv="refresh" content="{self._refresh_seconds}">'
+            '<title>RtdMonitor</title>'
+            f'</head><body>{"".join(l_img) if l_img else "no frame yet"}</body></html>'
+        ).encode('utf-8')
+
+    def handle_get(self, request: BaseHTTPRequestHandler):
+        path = unquote(request.path.split('?')[0])
+        version, frames, data_json = self.engine.get_frame()
+        if path in ['/', '/index.html']:
+            self._send(request, 200, 'html', self._page(frames))
+            return
+        _title, _, content_type = path[1:].rpartition('.')
+        if path == '/data.json':
+            content, content_type = data_json, 'json'
+        elif _title == 'frame' and frames and content_type in list(frames.values())[0]:
+            content = list(frames.values())[0][content_type]
+        elif _title in frames and content_type in frames[_title]:
+            content = frames[_title][content_type]
+        else:
+            self._send(request, 404, 'html', b'not found')
+            return
+
+        etag = f'"{version}"'
+        if request.headers.get('If-None-Match') == etag:
+            request.send_response(304)
+            request.send_header('ETag', etag)
+            request.end_headers()
+            return
+        self._send(request, 200, content_type, content, etag=etag)
+
+    @staticmethod
+    def _send(request: BaseHTTPRequestHandler, code, content_type, content: bytes, etag=None):
+        request.send_response(code)
+        request.send_header('Content-Type', CONTENT_TYPES[content_type])
+        request.send_header('Content-Length', str(len(content)))
+        request.send_header('Cache-Control', 'no-cache')
+        if etag:
+            request.send_header('ETag', etag)
+        request.end_headers()
+        request.wfile.write(content)
+
+    def serve_forever(self):
+        self.engine.logger.info(f'serving on http://{self._server.server_address[0]}:{self._server.server_address[1]}')
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,209 @@
+"""
+RtdMonitorEngine.data 的列式存储
+
+{
+    AxTitle: {                  # 1个图
+        column: RtdColumnBuffer,        # 1条折线, index(x轴) / value(y轴) 两个 append-only 的 numpy 数组
+    },
+}
+
+RtdColumnBuffer
+    容量不足时倍增，append 均摊 O(1)；
+    last_index / last_value 为 O(1)，不需要扫描整个 ax 的数据来找 column 的最新值。
+
+RtdRetentionPolicy
+    时间序列的保留策略：最近 full_resolution 内的数据全部保留，
+    更早的数据按时间分桶抽稀，每个 column 最多保留 图宽度（像素） * points_per_pixel 个点；
+    图宽度: 关联了画图的子图时（attach_axes），取子图当前的像素宽度（随窗口缩放变化），
+            否则（例如 只输出 json）使用 pixels。
+    每个桶保留 第一个 / 最小 / 最大 / 最后一个 点，阶梯图的形状（包括每个桶结束时的值）不变。
+"""
+
+from typing import Dict, List
+from datetime import datetime, time, timedelta
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class RtdRetentionPolicy:
+    full_resolution: timedelta = timedelta(minutes=60)      # 最近 N 分钟 保留全部数据
+    pixels: int = 1000              # 没有关联子图时 图的宽度（像素）
+    points_per_pixel: int = 2       # 每个像素最多的点数
+    # 关联的子图（matplotlib Axes），由 RtdMonitorEngine 配对 data_handler / plotter 时设置
+    axes: list = field(default_factory=list, repr=False, compare=False)
+
+    def attach_axes(self, l_axes: list):
+        self.axes = list(l_axes)
+
+    @property
+    def plot_pixels(self) -> int:
+        l_widths = [int(_ax.bbox.width) for _ax in self.axes]
+        return max(l_widths) if l_widths else self.pixels
+
+    @property
+    def max_history_points(self) -> int:
+        return max(self.plot_pixels * self.points_per_pixel, 4)
+
+
+class RtdColumnBuffer:
+    def __init__(self, capacity=256):
+        # index 可能是 datetime / time / str，使用 object 数组
+        self._index = np.empty(capacity, dtype=object)
+        self._value = np.empty(capacity, dtype='float64')
+        self.size = 0
+        # index 是否按升序添加；时间序列按文件顺序添加时为 True，画图时不需要再排序
+        self.is_sorted = True
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = max(len(self._value) * 2, 1)
+        _index = np.empty(capacity, dtype=object)
+        _value = np.empty(capacity, dtype='float64')
+        _index[:self.size] = self._index[:self.size]
+        _value[:self.size] = self._value[:self.size]
+        self._index, self._value = _index, _value
+
+    def append(self, index, value: float):
+        if self.size == len(self._value):
+            self._grow()
+        if self.size and self.is_sorted and index < self._index[self.size - 1]:
+            self.is_sorted = False
+        self._index[self.size] = index
+        self._value[self.size] = value
+        self.size += 1
+
+    @property
+    def index(self) -> np.ndarray:
+        return self._index[:self.size]
+
+    @property
+    def value(self) -> np.ndarray:
+        return self._value[:self.size]
+
+    @property
+    def last_index(self) -> str or datetime or time or None:
+        return self._index[self.size - 1] if self.size else None
+
+    @property
+    def last_value(self) -> float or None:
+        return float(self._value[self.size - 1]) if self.size else None
+
+    def decimate(self, cutoff, max_points: int) -> bool:
+        """
+        抽稀 index < cutoff 的数据，最多保留 max_points 个点；index 需要是 datetime 并且有序
+        return 是否修改了数据
+        """
+        if not self.is_sorted or self.size <= max_points:
+            return False
+        n_old = int(np.searchsorted(self.index, cutoff, side='left'))
+        if n_old <= max_points:
+            return False
+        index, value = self.index[:n_old], self.value[:n_old]
+
+        # 按时间等宽分桶; 抽稀到 max_points 的一半，之后不需要每次有新数据都重新抽稀
+        t0 = index[0]
+        _seconds = np.array([(_ - t0).total_seconds() for _ in index])
+        n_buckets = max(max_points // 8, 1)
+        _width = (_seconds[-1] / n_buckets) or 1.
+        bucket = np.minimum((_seconds / _width).astype('int64'), n_buckets - 1)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], n_old] - 1
+        # 桶内按 value 排序, 每个桶在 order 中的位置与 starts / ends 相同
+        order = np.lexsort((value, bucket))
+        keep = np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+
+        # 写入新数组，不修改 画图中可能仍在使用的旧数组
+        n_recent = self.size - n_old
+        size = len(keep) + n_recent
+        _index = np.empty(max(size * 2, 256), dtype=object)
+        _value = np.empty(max(size * 2, 256), dtype='float64')
+        _index[:len(keep)] = index[keep]
+        _value[:len(keep)] = value[keep]
+        _index[len(keep):size] = self._index[n_old:self.size]
+        _value[len(keep):size] = self._value[n_old:self.size]
+        self._index, self._value, self.size = _index, _value, size
+        return True
+
+    def sorted_data(self) -> (np.ndarray, np.ndarray):
+        """ return index, value; 按 index 排序 """
+        if self.is_sorted:
+            return self.index, self.value
+        order = np.argsort(self.index, kind='stable')
+        return self.index[order], self.value[order]
+
+
+class RtdSeriesStore:
+    def __init__(self):
+        self._data: Dict[str, Dict[str, RtdColumnBuffer]] = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, ax_name):
+        return ax_name in self._data
+
+    def keys(self) -> List[str]:
+        return list(self._data.keys())
+
+    def clear(self, ax_names=None):
+        # ax_names 为 None 时清空全部
+        if ax_names is None:
+            self._data = {}
+            return
+        for _ax_name in list(ax_names):
+            self._data.pop(_ax_name, None)
+
+    def append(self, ax_name: str, column: str, index, value: float):
+        _d_columns = self._data.setdefault(ax_name, {})
+        if column not in _d_columns:
+            _d_columns[column] = RtdColumnBuffer()
+        _d_columns[column].append(index, value)
+
+    def columns(self, ax_name: str) -> Dict[str, RtdColumnBuffer]:
+        return self._data.get(ax_name, {})
+
+    def last_value(self, ax_name: str, column: str) -> float or None:
+        _buffer = self._data.get(ax_name, {}).get(column)
+        return _buffer.last_value if _buffer is not None else None
+
+    def apply_retention(self, policy: RtdRetentionPolicy, ax_names=None) -> bool:
+        """ 按保留策略抽稀每个 column 的旧数据, return 是否修改了数据 """
+        _is_changed = False
+        for _ax_name in (list(self._data.keys()) if ax_names is None else list(ax_names)):
+            for _buffer in self.columns(_ax_name).values():
+                if not len(_buffer):
+                    continue
+                if _buffer.decimate(_buffer.last_index - policy.full_resolution, policy.max_history_points):
+                    _is_changed = True
+        return _is_changed
+
+    def to_dict(self, ax_names=None) -> dict:
+        """ {AxTitle: {column: {"index": [str], "value": [float]}}}, 用于输出 json """
+        return {
+            _ax_name: {
+                _column: {
+                    'index': [str(_) for _ in _buffer.index],
+                    'value': _buffer.value.tolist(),
+                }
+                for _column, _buffer in _d_columns.items()
+            }
+            for _ax_name, _d_columns in self._data.items()
+            if ax_names is None or _ax_name in ax_names
+        }
+
+    def to_frame(self, ax_name: str) -> pd.DataFrame:
+        """ DataFrame, columns: index, column, value """
+        _d_columns = self.columns(ax_name)
+        if not _d_columns:
+            return pd.DataFrame(columns=['index', 'column', 'value'])
+        return pd.DataFrame({
+            'index': np.concatenate([_buffer.index for _buffer in _d_columns.values()]),
+            'column': np.concatenate([
+                np.full(len(_buffer), _column, dtype=object) for _column, _buffer in _d_columns.items()]),
+            'value': np.concatenate([_buffer.value for _buffer in _d_columns.values()]),
+        })
@@ -1,32 +1,18 @@
 import os
-import shutil
 import argparse
 import sys
 from typing import Dict, List
-from collections import defaultdict
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
-arg_parser = argparse.ArgumentParser()
-arg_parser.add_argument('-p', '--position',)
-arg_parser.add_argument('-i', '--initX',)
-arg_parser.add_argument('-t', '--ticker_info', default='')
-arg_parser.add_argument('-w', '--white_list', default='')
-arg_parser.add_argument('-o', '--output',)
-args = arg_parser.parse_args()
-PATH_POSITION_ROOT = args.position
-PATH_GTI_File = args.ticker_info
-PATH_WHILT_LIST_File = args.white_list
-PATH_INITX_ROOT = args.initX
-PATH_OUTPUT_FILE = args.output
-if not os.path.isdir(os.path.dirname(PATH_OUTPUT_FILE)):
-    os.makedirs(os.path.dirname(PATH_OUTPUT_FILE))
-assert os.path.isdir(PATH_POSITION_ROOT)
-assert os.path.isdir(PATH_INITX_ROOT)
+import numpy as np
+import pandas as pd
 
 from pyptools.common.general_ticker_info import GeneralTickerInfoFile, TickerInfoData
 from pyptools.common.object import Product, Ticker
+from pyptools.common.common_util import atomic_open
+from helper.snapshot_dir import resolve_snapshot_dir
 
 
 D_TRADER_NAME_MAP = {
@@ -46,11 +32,15 @@ def handle_trader_name(name: str):
     return name
 
 
-if __name__ == '__main__':
-    # 读取position
-    d_trader_ticker_volume_px = defaultdict(dict)
-    for _file_name in os.listdir(PATH_POSITION_ROOT):
-        p_trader_position = os.path.join(PATH_POSITION_ROOT, _file_name)
+def read_traders_position(position_root) -> pd.DataFrame:
+    """
+    读取position
+    return DataFrame, columns: trader, ticker, volume, price
+    """
+    position_root = resolve_snapshot_dir(position_root)
+    l_traders, l_tickers, l_volumes, l_prices = [], [], [], []
+    for _file_name in os.listdir(position_root):
+        p_trader_position = os.path.join(position_root, _file_name)
         if not os.path.isfile(p_trader_position):
             continue
         _trader = _file_name.replace('.csv', '')
@@ -60,27 +50,45 @@ if __name__ == '__main__':
             line = line.strip()
             if line == '':
                 continue
-            _ticker = line.split(',')[0]
-            _volume = float(line.split(',')[1])
-            _price = float(line.split(',')[2])
-            d_trader_ticker_volume_px[_trader][_ticker] = _volume * _price
-
-    # 读取 general ticker info
-    if os.path.isfile(PATH_GTI_File):
-        d_ticker_info: Dict[Product, TickerInfoData] = GeneralTickerInfoFile.read(PATH_GTI_File)
-        for _trader, _d_trader_data in d_trader_ticker_volume_px.items():
-            for _ticker, _volume_px in _d_trader_data.items():
-                _product: Product = Ticker.from_name(_ticker).product
-                if _product not in d_ticker_info:
-                    print(f'GTI文件没有此 product: {str(_product)}')
-                    raise KeyError
-                _point_value = d_ticker_info[_product].point_value
-                _d_trader_data[_ticker] = _volume_px * _point_value
-
+            line_split = line.split(',')
+            l_traders.append(_trader)
+            l_tickers.append(line_split[0])
+            l_volumes.append(float(line_split[1]))
+            l_prices.append(float(line_split[2]))
+    return pd.DataFrame({
+        'trader': pd.Series(l_traders, dtype=object),
+        'ticker': pd.Series(l_tickers, dtype=object),
+        'volume': pd.Series(l_volumes, dtype='float64'),
+        'price': pd.Series(l_prices, dtype='float64'),
+    })
+
+
+def gen_traders_position_frame(d_traders_position: Dict[str, List[dict]]) -> pd.DataFrame:
+    """
+    get_trader_position 的持仓数据 -> DataFrame, 与 read_traders_position 相同
+    :param d_traders_position: { "Trader": [{"Ticker": , "Volume": , "Price": ,}, {}], }
+    """
+    l_traders, l_tickers, l_volumes, l_prices = [], [], [], []
+    for _trader, _trader_position in d_traders_position.items():
+        for _d_ticker_position in _trader_position:
+            l_traders.append(_trader)
+            l_tickers.append(_d_ticker_position['Ticker'])
+            l_volumes.append(float(_d_ticker_position['Volume']))
+            l_prices.append(float(_d_ticker_position['Price']))
+    return pd.DataFrame({
+        'trader': pd.Series(l_traders, dtype=object),
+        'ticker': pd.Series(l_tickers, dtype=object),
+        'volume': pd.Series(l_volumes, dtype='float64'),
+        'price': pd.Series(l_prices, dtype='float64'),
+    })
+
+
+def read_trader_initx(initx_root) -> Dict[str, float]:
     # 读取initx
+    initx_root = resolve_snapshot_dir(initx_root)
     d_trader_initX = dict()
-    for _file_name in os.listdir(PATH_INITX_ROOT):
-        p_trader_initx = os.path.join(PATH_INITX_ROOT, _file_name)
+    for _file_name in os.listdir(initx_root):
+        p_trader_initx = os.path.join(initx_root, _file_name)
         if not os.path.isfile(p_trader_initx):
             continue
         _trader = _file_name.replace('.csv', '')
@@ -92,35 +100,115 @@ if __name__ == '__main__':
             raise Exception
         _initx = float(_initx)
         d_trader_initX[_trader] = _initx
+    return d_trader_initX
+
+
+def read_white_list(p) -> List[str] or None:
+    # 白名单
+    if not os.path.isfile(p):
+        return None
+    with open(p) as f:
+        l_lines = f.readlines()
+    return [_.strip() for _ in l_lines if _.strip()]
+
+
+def _gen_point_values(l_tickers: List[str], d_ticker_info: Dict[Product, TickerInfoData]) -> Dict[str, float]:
+    # 每个 ticker 只解析一次 product
+    d_point_value = {}
+    for _ticker in l_tickers:
+        _product: Product = Ticker.from_name(_ticker).product
+        if _product not in d_ticker_info:
+            print(f'GTI文件没有此 product: {str(_product)}')
+            raise KeyError
+        d_point_value[_ticker] = d_ticker_info[_product].point_value
+    return d_point_value
+
+
+def cal_per_initx(
+        df_position: pd.DataFrame,
+        d_trader_initX: Dict[str, float],
+        d_ticker_info: Dict[Product, TickerInfoData] or None = None,
+        l_white_list: List[str] or None = None,
+) -> List[List[str]]:
+    """
+    volume * price * point_value / initX, 整列计算
+    :param df_position: columns: trader, ticker, volume, price; 同一 trader-ticker 有多行时取最后一行
+    return [[ticker, trader, position / initX], ]
+    """
+    if df_position.empty:
+        return []
+    df = df_position.assign(volume_px=df_position['volume'] * df_position['price'])
+    # 同一 trader-ticker 保留首次出现的顺序，取最后一行的数值（NaN 也照取，groupby.last 会跳过 NaN）;
+    # 按 trader 首次出现的顺序排列
+    l_keys = ['trader', 'ticker']
+    s_last = df.drop_duplicates(l_keys, keep='last').set_index(l_keys)['volume_px']
+    df = df.loc[~df.duplicated(l_keys), l_keys].join(s_last, on=l_keys).reset_index(drop=True)
+    df = df.iloc[np.argsort(pd.factorize(df['trader'])[0], kind='stable')]
+
+    # general ticker info
+    if d_ticker_info is not None:
+        d_point_value = _gen_point_values(df['ticker'].unique().tolist(), d_ticker_info)
+        df['volume_px'] = df['volume_px'] * df['ticker'].map(d_point_value)
 
     # 相除
-    _error = False
-    l_trader_ticker_volume_p_initx = []
-    for _trader in d_trader_ticker_volume_px.keys():
-        if _trader not in d_trader_initX:
+    l_missing_traders = df.loc[~df['trader'].isin(set(d_trader_initX.keys())), 'trader'].unique().tolist()
+    if l_missing_traders:
+        for _trader in l_missing_traders:
             print(f'{_trader} 缺少initX')
-            _error = True
-            continue
-        _initx = d_trader_initX[_trader]
-        for _ticker, _position in d_trader_ticker_volume_px[_trader].items():
-            l_trader_ticker_volume_p_initx.append([_ticker, _trader, str(_position / _initx)])
-    if _error:
         raise Exception
+    df['position'] = df['volume_px'] / df['trader'].map(d_trader_initX)
 
     # trader name 处理
-    for _ in l_trader_ticker_volume_p_initx:
-        _[1] = handle_trader_name(_[1])
+    d_trader_name = {_trader: handle_trader_name(_trader) for _trader in df['trader'].unique()}
+    df['trader'] = df['trader'].map(d_trader_name)
 
     # 白名单
-    if os.path.isfile(PATH_WHILT_LIST_File):
-        with open(PATH_WHILT_LIST_File) as f:
-            l_lines = f.readlines()
-        l_white_list = [_.strip() for _ in l_lines if _.strip()]
-        l_trader_ticker_volume_p_initx = [_ for _ in l_trader_ticker_volume_p_initx if _[1] in l_white_list]
+    if l_white_list is not None:
+        df = df.loc[df['trader'].isin(set(l_white_list)), :]
 
-    # 输出
-    with open(PATH_OUTPUT_FILE, 'w') as f:
+    return [
+        [_ticker, _trader, str(_position)]
+        for _ticker, _trader, _position in zip(
+            df['ticker'].tolist(), df['trader'].tolist(), df['position'].tolist())
+    ]
+
+
+def write_per_initx(output_file, l_trader_ticker_volume_p_initx: List[List[str]]):
+    # 输出, 先写临时文件再替换，画图程序不会读到空文件或写了一半的文件
+    with atomic_open(output_file, 'w', encoding=None) as f:
         f.writelines('\n'.join([
             ','.join(_)
             for _ in l_trader_ticker_volume_p_initx
         ]))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-p', '--position',)
+    arg_parser.add_argument('-i', '--initX',)
+    arg_parser.add_argument('-t', '--ticker_info', default='')
+    arg_parser.add_argument('-w', '--white_list', default='')
+    arg_parser.add_argument('-o', '--output',)
+    args = arg_parser.parse_args()
+    PATH_POSITION_ROOT = args.position
+    PATH_GTI_File = args.ticker_info
+    PATH_WHILT_LIST_File = args.white_list
+    PATH_INITX_ROOT = args.initX
+    PATH_OUTPUT_FILE = args.output
+    assert os.path.isdir(PATH_POSITION_ROOT)
+    assert os.path.isdir(PATH_INITX_ROOT)
+
+    # 读取 general ticker info
+    d_ticker_info = None
+    if os.path.isfile(PATH_GTI_File):
+        d_ticker_info: Dict[Product, TickerInfoData] = GeneralTickerInfoFile.read(PATH_GTI_File)
+
+    write_per_initx(
+        PATH_OUTPUT_FILE,
+        cal_per_initx(
+            read_traders_position(PATH_POSITION_ROOT),
+            read_trader_initx(PATH_INITX_ROOT),
+            d_ticker_info=d_ticker_info,
+            l_white_list=read_white_list(PATH_WHILT_LIST_File),
+        )
+    )
@@ -0,0 +1,158 @@
+"""
+常驻的持仓数据收集器
+
+替代 run.py 中每个循环调用 bat（每次启动新的 python 进程、重新 import、重新连接db）的方式，
+在同一个进程、同一个 event loop 中按顺序运行各个步骤，engine（连接池）在循环之间复用：
+    1, 从各个Oms.db 获取position           -> PositionSnapshot
+    2, 从QMReport.db 获取initX             -> InitXSnapshot
+    3, 分Trader 计算PerInitX                -> _Output_3_PositionPInitX/data.{name}.csv
+步骤1 与 步骤2 相互独立，并发运行。
+各步骤之间直接传递内存中的数据快照，不再经过 csv 目录；
+步骤1、2 的 csv 输出（_Output_1_Position, _Output_2_InitX）仅在 output_stage_files=True 时写出，用于检查。
+"""
+
+import os
+import sys
+import asyncio
+import logging
+from datetime import datetime
+from dataclasses import dataclass
+from typing import Dict, List, Callable
+
+PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
+sys.path.append(PATH_ROOT)
+
+from get_trader_position import (
+    read_oms_db_infos, OmsPositionFetcher, gen_traders_position, filter_recent_traders, write_traders_position
+)
+from get_trader_initx import read_qm_db_info, InitXFetcher, write_traders_initx
+from cleaning_data_for_perInitX import (
+    gen_traders_position_frame, read_white_list, cal_per_initx, write_per_initx
+)
+from pyptools.common.general_ticker_info import GeneralTickerInfoFile
+from helper.simpleLogger import MyLogger
+from helper.snapshot_dir import new_snapshot_dir
+
+
+@dataclass
+class PositionSnapshot:
+    datetime: datetime
+    # { "Trader": [{"Ticker": , "Volume": , "Price": ,}, {}], }
+    traders_position: Dict[str, List[dict]]
+    traders_position_update_time: Dict[str, datetime]
+
+
+@dataclass
+class InitXSnapshot:
+    datetime: datetime
+    traders_initx: Dict[str, float]
+
+
+class PositionCollector:
+    def __init__(
+            self,
+            path_oms_db_info,
+            path_qm_db_info,
+            path_ticker_info,
+            d_white_list: Dict[str, str],       # {name: white list file}, 输出 data.{name}.csv
+            output_root=PATH_ROOT,
+            timeout=10,         # 每个oms db 查询的最长等待时间
+            reconcile_interval=300,     # 增量持仓簿 全量校正的间隔
+            output_stage_files=False,   # 是否输出 步骤1、2 的 csv
+            logger: logging.Logger = None,
+    ):
+        self.logger = logger if logger else MyLogger('PositionCollector')
+        self._path_ticker_info = path_ticker_info
+        self._d_white_list = d_white_list
+        self._output_stage_files = output_stage_files
+
+        self.path_position_root = os.path.join(output_root, '_Output_1_Position')
+        self.path_initx_root = os.path.join(output_root, '_Output_2_InitX')
+        self.path_per_initx_root = os.path.join(output_root, '_Output_3_PositionPInitX')
+
+        # 常驻进程，增量查询持仓
+        self._position_fetcher = OmsPositionFetcher(
+            read_oms_db_infos(path_oms_db_info), timeout=timeout,
+            incremental=True, reconcile_interval=reconcile_interval,
+        )
+        qm_db_info = read_qm_db_info(path_qm_db_info)
+        self._initx_fetcher = InitXFetcher(
+            db=qm_db_info['db'],
+            host=qm_db_info['host'],
+            user=qm_db_info['user'],
+            pwd=qm_db_info['pwd'],
+        )
+
+        # 各步骤最新的结果
+        self.position_snapshot: PositionSnapshot or None = None
+        self.initx_snapshot: InitXSnapshot or None = None
+        self.per_initx: Dict[str, List[List[str]]] = {}
+
+    # ========== 各个步骤, 在 executor 中运行 ==========
+    def _stage_position(self) -> PositionSnapshot:
+        d_traders_position, d_traders_position_update_time = gen_traders_position(self._position_fetcher.fetch())
+        if self._output_stage_files:
+            with new_snapshot_dir(self.path_position_root) as p_output:
+                write_traders_position(p_output, d_traders_position, d_traders_position_update_time)
+        return PositionSnapshot(
+            datetime=datetime.now(),
+            traders_position=filter_recent_traders(d_traders_position, d_traders_position_update_time),
+            traders_position_update_time=dict(d_traders_position_update_time),
+        )
+
+    def _stage_initx(self) -> InitXSnapshot:
+        d_traders_initx = self._initx_fetcher.fetch()
+        if self._output_stage_files:
+            with new_snapshot_dir(self.path_initx_root) as p_output:
+                write_traders_initx(p_output, d_traders_initx)
+        return InitXSnapshot(
+            datetime=datetime.now(),
+            traders_initx={_trader: float(_initx) for _trader, _initx in d_traders_initx.items()},
+        )
+
+    def _stage_per_initx(self, position_snapshot: PositionSnapshot, initx_snapshot: InitXSnapshot):
+        d_ticker_info = None
+        if os.path.isfile(self._path_ticker_info):
+            d_ticker_info = GeneralTickerInfoFile.read(self._path_ticker_info)
+        df_position = gen_traders_position_frame(position_snapshot.traders_position)
+        for _name, _path_white_list in self._d_white_list.items():
+            self.logger.info(f'calculating PerInitX position, {_name}')
+            l_per_initx = cal_per_initx(
+                df_position,
+                initx_snapshot.traders_initx,
+                d_ticker_info=d_ticker_info,
+                l_white_list=read_white_list(_path_white_list),
+            )
+            self.per_initx[_name] = l_per_initx
+            write_per_initx(os.path.join(self.path_per_initx_root, f'data.{_name}.csv'), l_per_initx)
+
+    # ========== event loop ==========
+    async def run_once(self):
+        loop = asyncio.get_running_loop()
+        self.logger.info('collecting position and initX')
+        self.position_snapshot, self.initx_snapshot = await asyncio.gather(
+            loop.run_in_executor(None, self._stage_position),
+            loop.run_in_executor(None, self._stage_initx),
+        )
+        await loop.run_in_executor(None, self._stage_per_initx, self.position_snapshot, self.initx_snapshot)
+
+    async def run(
+            self, interval,
+            is_running: Callable[[], bool] = lambda: True,
+            wait: Callable[[float], bool] or None = None,     # 例如 ScheduleRunner.wait, 运行时间结束时立即返回
+    ):
+        loop = asyncio.get_running_loop()
+        while is_running():
+            _t_start = loop.time()
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.logger.error(f'collecting error: {e}')
+            _remaining = max(interval - (loop.time() - _t_start), 0)
+            if wait is None:
+                await asyncio.sleep(_remaining)
+            else:
+                await loop.run_in_executor(None, wait, _remaining)
+
+    def close(self):
+        self._position_fetcher.close()
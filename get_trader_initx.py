@@ -1,83 +1,133 @@
 import os
-import shutil
 import argparse
 import sys
 from typing import Dict, List
-from collections import defaultdict
 from datetime import datetime, timedelta
-from time import sleep
-from sqlalchemy import create_engine, desc
-from sqlalchemy.orm import sessionmaker
-from urllib import parse
+from sqlalchemy import select, func, and_
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
 from pyptools.pyptools_qm.db import PnL
+from pyptools.common.db_engine import DbEngine, get_db_engine
+from helper.snapshot_dir import new_snapshot_dir
 
-arg_parser = argparse.ArgumentParser()
-arg_parser.add_argument('-i', '--info_file',)
-arg_parser.add_argument('-o', '--output',)
-args = arg_parser.parse_args()
-INFO_FILE = args.info_file
-OUTPUT_ROOT = args.output
-if os.path.isdir(OUTPUT_ROOT):
-    shutil.rmtree(OUTPUT_ROOT)
-    sleep(1)
-os.makedirs(OUTPUT_ROOT)
 
-
-if __name__ == '__main__':
+def read_qm_db_info(info_file) -> dict:
     # 读取db连接信息
-    l_oms_db_infos: List[dict] = []
-    with open(INFO_FILE) as f:
+    with open(info_file) as f:
         l_lines = f.readlines()
     line = l_lines[0].strip()
     if line == '':
-        print(f'{INFO_FILE} 格式错误')
+        print(f'{info_file} 格式错误')
         raise Exception
     line_split = line.split(',')
     try:
-        _host = line_split[0]
-        _user = line_split[1]
-        _pwd = line_split[2]
-        _db = line_split[3]
+        return {
+            "host": line_split[0],
+            "user": line_split[1],
+            "pwd": line_split[2],
+            "db": line_split[3],
+        }
     except :
-        print(f'{INFO_FILE} 格式错误')
+        print(f'{info_file} 格式错误')
         raise Exception
 
-    # 连接db
-    engine = create_engine(
-        f'mssql+pymssql://{str(_user)}:{parse.quote_plus(_pwd)}@{str(_host)}/{str(_db)}',
-        echo=False,
-        max_overflow=50,  # 超过连接池大小之后，允许最大扩展连接数；
-        pool_size=50,  # 连接池的大小
-        pool_timeout=600,  # 连接池如果没有连接了，最长的等待时间
-        pool_recycle=-1,  # 多久之后对连接池中连接进行一次回收
-    )
-    # 创建DBSession类
-    DBSession = sessionmaker(bind=engine)
-    session = DBSession()
-
-    # 获取db 数据
-    querying_dt = datetime.now() - timedelta(days=3)
-    l_pnls: List[PnL] = session.query(PnL).filter(PnL.DataTime > querying_dt).all()
-    session.close()
-    # 筛选
-    d_traders_pnl: Dict[str, PnL] = {}
-    for _pnl in l_pnls:
-        _trader = _pnl.Trader
-        if 'test' in _trader.lower():
-            continue
-        _datatime = _pnl.DataTime
-        if _trader not in d_traders_pnl:
-            d_traders_pnl[_trader] = _pnl
-        else:
-            if _datatime > d_traders_pnl[_trader].DataTime:
-                d_traders_pnl[_trader] = _pnl
 
+class InitXFetcher:
+    """
+    从 QMReport.PnL 获取各个 trader 最新的 initX
+    engine（连接池）在多次 fetch 之间复用
+
+    1, 在db中 GROUP BY Trader 得到每个 trader 最新的 DataTime（主键索引 (Trader, DataTime)，只返回 trader 数量的行）
+    2, 只有最新 DataTime 发生变化的 trader，才重新查询其最新一行的 InitX；其余 trader 使用缓存
+    """
+    def __init__(self, db, host, user, pwd, echo=False, lookback=timedelta(days=3), chunk_size=500):
+        # 连接db, 进程内共享 engine（连接池）
+        self.db_engine: DbEngine = get_db_engine(db=db, host=host, user=user, pwd=pwd, echo=echo)
+        self._lookback = lookback
+        self._chunk_size = chunk_size       # IN (...) 参数个数上限
+
+        # 缓存 {trader: DataTime}, {trader: InitX}
+        self._d_traders_datatime: Dict[str, datetime] = {}
+        self._d_traders_initx: Dict[str, float] = {}
+
+    def _query_latest_datatime(self, conn, querying_dt) -> Dict[str, datetime]:
+        stmt = select(PnL.Trader, func.max(PnL.DataTime)).where(
+            PnL.DataTime > querying_dt).group_by(PnL.Trader)
+        return {
+            _trader: _datatime
+            for _trader, _datatime in conn.execute(stmt)
+            if 'test' not in _trader.lower()
+        }
+
+    def _query_latest_initx(self, conn, querying_dt, l_traders: List[str]) -> Dict[str, tuple]:
+        """ return {trader: (DataTime, InitX)} """
+        d_latest = {}
+        for n in range(0, len(l_traders), self._chunk_size):
+            _l_traders = l_traders[n: n + self._chunk_size]
+            sub = select(
+                PnL.Trader.label('Trader'), func.max(PnL.DataTime).label('DataTime')
+            ).where(and_(
+                PnL.DataTime > querying_dt, PnL.Trader.in_(_l_traders)
+            )).group_by(PnL.Trader).subquery()
+            stmt = select(PnL.Trader, PnL.DataTime, PnL.InitX).join(
+                sub, and_(PnL.Trader == sub.c.Trader, PnL.DataTime == sub.c.DataTime))
+            for _trader, _datatime, _initx in conn.execute(stmt):
+                d_latest[_trader] = (_datatime, _initx)
+        return d_latest
+
+    def fetch(self) -> Dict[str, float]:
+        """ return {trader: initX} """
+        querying_dt = datetime.now() - self._lookback
+        with self.db_engine.connect() as conn:
+            d_traders_datatime = self._query_latest_datatime(conn, querying_dt)
+            l_changed_traders = [
+                _trader for _trader, _datatime in d_traders_datatime.items()
+                if self._d_traders_datatime.get(_trader) != _datatime
+            ]
+            d_latest = {}
+            if l_changed_traders:
+                d_latest = self._query_latest_initx(conn, querying_dt, l_changed_traders)
+
+        for _trader, (_datatime, _initx) in d_latest.items():
+            self._d_traders_datatime[_trader] = _datatime
+            self._d_traders_initx[_trader] = _initx
+        # 超出查询时间范围的 trader
+        for _trader in list(self._d_traders_datatime.keys()):
+            if _trader not in d_traders_datatime:
+                self._d_traders_datatime.pop(_trader)
+                self._d_traders_initx.pop(_trader)
+        return {
+            _trader: self._d_traders_initx[_trader]
+            for _trader in d_traders_datatime.keys()
+            if _trader in self._d_traders_initx
+        }
+
+
+def write_traders_initx(output_root, d_traders_initx: Dict[str, float]):
     # 输出
-    for _trader, _pnl in d_traders_pnl.items():
-        output_file = os.path.join(OUTPUT_ROOT, _trader + '.csv')
+    for _trader, _initx in d_traders_initx.items():
+        output_file = os.path.join(output_root, _trader + '.csv')
         with open(output_file, 'w') as f:
-            f.writelines(str(_pnl.InitX))
+            f.writelines(str(_initx))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-i', '--info_file',)
+    arg_parser.add_argument('-o', '--output',)
+    args = arg_parser.parse_args()
+    INFO_FILE = args.info_file
+    OUTPUT_ROOT = args.output
+
+    db_info = read_qm_db_info(INFO_FILE)
+    d_traders_initx = InitXFetcher(
+        db=db_info['db'],
+        host=db_info['host'],
+        user=db_info['user'],
+        pwd=db_info['pwd'],
+    ).fetch()
+    # 写入新的版本目录，完成后切换 current
+    with new_snapshot_dir(OUTPUT_ROOT) as p_output:
+        write_traders_initx(p_output, d_traders_initx)
@@ -1,33 +1,30 @@
 import os
-import shutil
 import argparse
 import sys
+import json
+import threading
 from typing import Dict, List
 from collections import defaultdict
-from time import sleep
+from concurrent.futures import Future, wait
 from datetime import datetime, timedelta
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 sys.path.append(PATH_ROOT)
 
-from pyptools.pyptools_oms.db import OmsDbManagement, TraderPosition
+from pyptools.pyptools_oms.db import OmsDbManagement, POSITION_COLUMNS
+from pyptools.pyptools_oms.position_book import PositionBook
+from pyptools.common.common_util import atomic_open
+from helper.snapshot_dir import new_snapshot_dir
 
-arg_parser = argparse.ArgumentParser()
-arg_parser.add_argument('-i', '--info_file',)
-arg_parser.add_argument('-o', '--output',)
-args = arg_parser.parse_args()
-INFO_FILE = args.info_file
-OUTPUT_ROOT = args.output
-if os.path.isdir(OUTPUT_ROOT):
-    shutil.rmtree(OUTPUT_ROOT)
-    sleep(1)
-os.makedirs(OUTPUT_ROOT)
 
+# 输出目录下的持仓快照文件（以 . 开头，不会被 new_snapshot_dir 清理）
+SNAPSHOT_FILE_NAME = '.position_snapshot.json'
 
-if __name__ == '__main__':
+
+def read_oms_db_infos(info_file) -> List[dict]:
     # 读取oms db信息文件
     l_oms_db_infos: List[dict] = []
-    with open(INFO_FILE) as f:
+    with open(info_file) as f:
         l_lines = f.readlines()
     for line in l_lines:
         line = line.strip()
@@ -42,27 +39,147 @@ if __name__ == '__main__':
                 "db": line_split[3],
             })
         except :
-            print(f'{INFO_FILE} 格式错误')
+            print(f'{info_file} 格式错误')
             raise Exception
-    # 获取 db position 数据
+    return l_oms_db_infos
+
+
+def _db_key(db_info: dict) -> str:
+    return f'{db_info["host"]}/{db_info["db"]}'
+
+
+class OmsPositionFetcher:
+    """
+    并发获取多个 oms db 的持仓
+
+    每个db在独立的 daemon 线程中查询，整体最多等待 timeout 秒，超时未返回的线程不会阻止进程退出；
+    超时或出错的db，沿用其上一次成功获取的持仓快照（last good snapshot），不影响本次循环；
+    仍在运行中的（上一次超时未返回的）db查询，不会重复提交，避免线程堆积；
+    每个db的 OmsDbManagement 在多次 fetch 之间复用。
+
+    incremental=True 时（常驻进程中使用），每个db维护一个 PositionBook，
+    只查询 UpdateTime 发生变化的持仓，每隔 reconcile_interval 秒全量校正一次。
+    """
+    def __init__(self, l_oms_db_infos: List[dict], timeout=10,
+                 incremental=False, reconcile_interval=300):
+        self._l_oms_db_infos = l_oms_db_infos
+        self._timeout = timeout
+        self._incremental = incremental
+        self._reconcile_interval = reconcile_interval
+        # { db_key: [{"Trader": , "Ticker": , ...}, ] }
+        self.snapshots: Dict[str, List[dict]] = {}
+        self.snapshots_time: Dict[str, datetime] = {}
+        self._running: Dict[str, Future] = {}
+        self._oms_dbs: Dict[str, OmsDbManagement] = {}
+        self._position_books: Dict[str, PositionBook] = {}
+
+    def _query_db_positions(self, db_info: dict) -> List[dict]:
+        """ 在工作线程中运行，查询一个db的全部持仓，转换成 dict 后返回 """
+        _key = _db_key(db_info)
+        if _key not in self._oms_dbs:
+            self._oms_dbs[_key] = OmsDbManagement(
+                db=db_info['db'],
+                host=db_info['host'],
+                user=db_info['user'],
+                pwd=db_info['pwd'],
+            )
+        _oms_db = self._oms_dbs[_key]
+        if self._incremental:
+            if _key not in self._position_books:
+                self._position_books[_key] = PositionBook(_oms_db, reconcile_interval=self._reconcile_interval)
+            return self._position_books[_key].sync()
+        # 只查询需要的列，不经过 ORM
+        return [dict(zip(POSITION_COLUMNS, _row)) for _row in _oms_db.query_positions_columns()]
+
+    @staticmethod
+    def _submit(key, func, *args) -> Future:
+        """ 在 daemon 线程中运行 func """
+        future = Future()
+
+        def _run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=_run, name=f'OmsPositionFetcher-{key}', daemon=True).start()
+        return future
+
+    def fetch(self) -> Dict[str, List[dict]]:
+        d_futures: Dict[str, Future] = {}
+        for db_info in self._l_oms_db_infos:
+            _key = _db_key(db_info)
+            _future = self._running.get(_key)
+            if _future is None or _future.done():
+                _future = self._submit(_key, self._query_db_positions, db_info)
+                self._running[_key] = _future
+            else:
+                print(f'{_key} 上一次查询仍未返回')
+            d_futures[_key] = _future
+
+        wait(list(d_futures.values()), timeout=self._timeout)
+        dt_now = datetime.now()
+        for _key, _future in d_futures.items():
+            if not _future.done():
+                print(f'{_key} 查询超时, 沿用上一次持仓快照')
+                continue
+            try:
+                self.snapshots[_key] = _future.result()
+            except Exception as e:
+                print(f'{_key} 查询失败, 沿用上一次持仓快照: {e}')
+                continue
+            self.snapshots_time[_key] = dt_now
+        # 按照 db信息文件 中的顺序返回
+        return {
+            _key: self.snapshots[_key]
+            for _key in d_futures.keys()
+            if _key in self.snapshots
+        }
+
+    def load_snapshots(self, p):
+        if not os.path.isfile(p):
+            return
+        with open(p, encoding='utf-8') as f:
+            d_snapshots = json.load(f)
+        for _key, _l_position in d_snapshots.items():
+            for _p in _l_position:
+                _p['UpdateTime'] = datetime.strptime(_p['UpdateTime'], '%Y%m%d %H%M%S')
+            self.snapshots[_key] = _l_position
+
+    def save_snapshots(self, p):
+        d_snapshots = {
+            _key: [dict(_p, UpdateTime=_p['UpdateTime'].strftime('%Y%m%d %H%M%S')) for _p in _l_position]
+            for _key, _l_position in self.snapshots.items()
+        }
+        if not os.path.isdir(os.path.dirname(os.path.abspath(p))):
+            os.makedirs(os.path.dirname(os.path.abspath(p)))
+        with atomic_open(p, 'w', encoding='utf-8') as f:
+            json.dump(d_snapshots, f)
+
+    def close(self):
+        # 仍在运行的查询线程为 daemon, 不等待
+        self._running.clear()
+
+
+def gen_traders_position(snapshots: Dict[str, List[dict]]):
+    """
+    合并各个db的持仓
+    :return: d_traders_position, d_traders_position_update_time
+    """
     # { "Trader": [{"Ticker": , "Volume": , "Price": ,}, {}], }
     d_traders_position = defaultdict(list)
     # 最新持仓更新日期，用于剔除那些旧的trader持仓
     d_traders_position_update_time: Dict[str, datetime] = defaultdict(lambda: datetime(2020, 1, 1))
-    for db_info in l_oms_db_infos:
-        _l_position: List[TraderPosition] = OmsDbManagement(
-            db=db_info['db'],
-            host=db_info['host'],
-            user=db_info['user'],
-            pwd=db_info['pwd'],
-        ).query_positions()
+    for _l_position in snapshots.values():
         for _p in _l_position:
-            _trader = _p.Trader
-            _ticker = _p.Ticker
-            _l_volume = _p.LongVolume
-            _s_volume = _p.ShortVolume
-            _l_price = _p.LongPrice
-            _s_price = _p.ShortPrice
+            _trader = _p['Trader']
+            _ticker = _p['Ticker']
+            _l_volume = _p['LongVolume']
+            _s_volume = _p['ShortVolume']
+            _l_price = _p['LongPrice']
+            _s_price = _p['ShortPrice']
             _volume = _l_volume - _s_volume
             _price = 0
             if _volume:
@@ -73,18 +190,57 @@ if __name__ == '__main__':
                 "Price": _price
             })
             # 最新持仓更新日期
-            _update_time = _p.UpdateTime
+            _update_time = _p['UpdateTime']
             if _update_time > d_traders_position_update_time[_trader]:
                 d_traders_position_update_time[_trader] = _update_time
+    return d_traders_position, d_traders_position_update_time
 
+
+def filter_recent_traders(d_traders_position, d_traders_position_update_time, max_gap=timedelta(days=1)) -> dict:
+    # 剔除那些旧的trader持仓
     dt_now = datetime.now()
+    return {
+        _trader: _trader_position
+        for _trader, _trader_position in d_traders_position.items()
+        if dt_now - d_traders_position_update_time[_trader] <= max_gap
+    }
+
+
+def write_traders_position(output_root, d_traders_position, d_traders_position_update_time):
+    d_traders_position = filter_recent_traders(d_traders_position, d_traders_position_update_time)
     for _trader, _trader_position in d_traders_position.items():
-        if dt_now - d_traders_position_update_time[_trader] > timedelta(days=1):
-            continue
-        output_file = os.path.join(OUTPUT_ROOT, _trader + '.csv')
+        output_file = os.path.join(output_root, _trader + '.csv')
         l_output_s = [
             ",".join([str(_) for _ in _d_ticker_position.values()])
             for _d_ticker_position in _trader_position
         ]
         with open(output_file, 'w') as f:
             f.writelines('\n'.join(l_output_s))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-i', '--info_file',)
+    arg_parser.add_argument('-o', '--output',)
+    arg_parser.add_argument('--timeout', type=float, default=10, help='每个db查询的最长等待时间(s)')
+    arg_parser.add_argument(
+        '--snapshot', default='',
+        help=f'持仓快照文件，db超时时沿用其中的上一次持仓; 默认为 输出目录/{SNAPSHOT_FILE_NAME}')
+    args = arg_parser.parse_args()
+    INFO_FILE = args.info_file
+    OUTPUT_ROOT = args.output
+    PATH_SNAPSHOT_FILE = args.snapshot or os.path.join(OUTPUT_ROOT, SNAPSHOT_FILE_NAME)
+
+    # 读取oms db信息文件
+    l_oms_db_infos: List[dict] = read_oms_db_infos(INFO_FILE)
+    # 并发获取 db position 数据
+    fetcher = OmsPositionFetcher(l_oms_db_infos, timeout=args.timeout)
+    fetcher.load_snapshots(PATH_SNAPSHOT_FILE)
+    d_snapshots = fetcher.fetch()
+    fetcher.save_snapshots(PATH_SNAPSHOT_FILE)
+    fetcher.close()
+
+    d_traders_position, d_traders_position_update_time = gen_traders_position(d_snapshots)
+    # 写入新的版本目录，完成后切换 current
+    with new_snapshot_dir(OUTPUT_ROOT) as p_output:
+        write_traders_position(p_output, d_traders_position, d_traders_position_update_time)
@@ -1,43 +1,27 @@
 from datetime import datetime
 import os
-import subprocess
-from enum import Enum
-from dataclasses import dataclass
+from typing import List, Dict
 
 import logging
 try:
     from .simpleLogger import MyLogger
+    from .constant import MCTask, MessageClientRtnData
+    from .transport import (
+        MCRequest, MessageTransport, ExeTransport, RequestRetry, check_timestamp,
+        gen_getmessage_requests, merge_getmessage_results, gen_sendmessage_requests, gen_send_timestamp_requests)
+    from .cache import TimestampCache, get_cached_rtn_data, put_cached_rtn_data
 except:
     from simpleLogger import MyLogger
+    from constant import MCTask, MessageClientRtnData
+    from transport import (
+        MCRequest, MessageTransport, ExeTransport, RequestRetry, check_timestamp,
+        gen_getmessage_requests, merge_getmessage_results, gen_sendmessage_requests, gen_send_timestamp_requests)
+    from cache import TimestampCache, get_cached_rtn_data, put_cached_rtn_data
 
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 PATH_MC = os.path.join(PATH_ROOT, 'TradingPlatform.MessageClient')
 PATH_MC_EXE = os.path.join(PATH_MC, 'TradingPlatform.MessageClient.exe')
-assert os.path.isfile(PATH_MC_EXE)
-
-
-class RunException(Enum):
-    """
-    """
-    TimeOut = 0
-    Error = -1
-
-
-class MCTask(Enum):
-    SendFile = 'sendfile'
-    SendMessage = 'sendmessage'
-    GetFile = 'getfile'
-    GetMessage = 'getmessage'
-    Status = 'status'
-    Clear = 'clear'
-
-
-@dataclass
-class MessageClientRtnData:
-    datetime: datetime
-    exception: RunException or None
-    msg: str = ''
 
 
 class MessageClient:
@@ -45,7 +29,20 @@ class MessageClient:
             self,
             ip, port,
             logger: logging.Logger or None = None,
+            transport: str or MessageTransport = 'exe',     # 'exe' / MessageTransport
+            exe_workers=8,      # exe, 多个请求时 并发运行的 exe 数
+            cache_ttl: float or None = None,        # timestamp 模式读取结果的缓存时间(s), None 不缓存
+            cache_size=256,
+            cache_bytes=64 * 1024 * 1024,
     ):
+        """
+        transport
+            exe     每次请求调用 TradingPlatform.MessageClient.exe（默认，MSServer 只支持此方式）
+            MessageTransport 实例，例如 测试中替代 exe
+        cache_ttl
+            getfile / getmessage（with_timestamp_gap）时，dt# 时间戳与上一次相同则使用缓存的内容，不再下载；
+            命中率见 cache.stats()
+        """
         self._ip = ip
         self._port = port
         self._message_client = PATH_MC
@@ -55,6 +52,20 @@ class MessageClient:
         else:
             self.logger = MyLogger(name='MessageClient')
 
+        if isinstance(transport, MessageTransport):
+            self._transport = transport
+        elif transport == 'exe':
+            assert os.path.isfile(PATH_MC_EXE)
+            self._transport = ExeTransport(
+                ip=ip, port=port, path_mc=PATH_MC, path_mc_exe=PATH_MC_EXE, logger=self.logger,
+                max_workers=exe_workers)
+        else:
+            raise Exception(f'未知的 transport: {transport}')
+
+        self.cache: TimestampCache or None = None
+        if cache_ttl:
+            self.cache = TimestampCache(ttl=cache_ttl, max_size=cache_size, max_bytes=cache_bytes)
+
     @staticmethod
     def _check_timeout_arg(timeout, default=5) -> float:
         try:
@@ -79,65 +90,30 @@ class MessageClient:
         finally:
             return max_try
 
-    def _run_tp_mc(self, s_cmd, timeout) -> MessageClientRtnData:
-        p = subprocess.Popen(
-            s_cmd,
-            cwd=self._message_client,
-            stdout=subprocess.PIPE,
-            shell=True,
-        )
-
-        try:
-            outs, errs = p.communicate(timeout=timeout)
-            output_s = str(outs, encoding="utf-8")
-        except subprocess.TimeoutExpired as e:
-            p.kill()
-            self.logger.error('调用 MessageClient 超时:')
-            self.logger.error(e)
-            return MessageClientRtnData(datetime=datetime.now(), exception=RunException.TimeOut, msg=str(e))
-        except Exception as e:
-            p.kill()
-            self.logger.error('调用 MessageClient 失败:')
-            self.logger.error(e)
-            return MessageClientRtnData(datetime=datetime.now(), exception=RunException.Error, msg=str(e))
-        else:
-            if 'Exception' in output_s:
-                p.kill()
-                self.logger.warning('调用 MessageClient 失败:')
-                self.logger.warning(output_s)
-                return MessageClientRtnData(datetime=datetime.now(), exception=RunException.Timeout, msg=output_s)
-            else:
-                p.kill()
-                print(output_s)
-                return MessageClientRtnData(
-                    # datetime=datetime.now(), exception=None, msg=output_s.split('\n')[1].split('<<')[1].strip())
-                    datetime=datetime.now(), exception=None, msg=output_s.split('<<')[-1].strip())
-
-    def _run(self, cmd, timeout=5, max_try=5) -> MessageClientRtnData:
+    def _run_many(self, l_requests: List[MCRequest], timeout=5, max_try=5) -> List[MessageClientRtnData]:
+        """
+        运行多个请求，失败的请求重试，按顺序返回结果
+            exe     每个请求一个 exe 进程，最多 exe_workers 个并发运行
+        """
         timeout = self._check_timeout_arg(timeout, default=5)
         max_try = self._check_maxtry_arg(max_try, default=5)
 
-        s_cmd = f'TradingPlatform.MessageClient.exe {self._ip} {self._port} {cmd}'
-        for n in range(max_try):
-            rtn_data: MessageClientRtnData = self._run_tp_mc(s_cmd=s_cmd, timeout=timeout)
-            error_type: RunException or None = rtn_data.exception
-            if not error_type:
-                # print(rtn_data.msg)
-                return rtn_data
-            else:
-                if error_type == RunException.TimeOut:
-                    self.logger.error(f'第{n+1}次运行，超时')
-                    continue
-                if error_type == RunException.Error:
-                    self.logger.error(f'第{n + 1}次运行，失败')
-                    continue
-        self.logger.error('超过最大运行次数')
-        return MessageClientRtnData(datetime=datetime.now(), exception=RunException.Error, msg='')
+        retry = RequestRetry(l_requests)
+        for n_try in range(max_try):
+            l_rtn_data = self._transport.run(retry.pending_requests(), timeout=timeout)
+            if retry.update(l_rtn_data, n_try, self.logger):
+                break
+        return retry.result(self.logger)
+
+    def _run(self, request: MCRequest, timeout=5, max_try=5) -> MessageClientRtnData:
+        return self._run_many([request], timeout=timeout, max_try=max_try)[0]
+
+    def close(self):
+        self._transport.close()
 
     def sendfile(self, key, file_path, timeout=5, max_try=5, with_timestamp: bool = False) -> MessageClientRtnData:
-        s_cmd = f'{MCTask.SendFile.value} "{key}" "{file_path}"'
-        # self.logger.info(s_cmd)
-        mcr: MessageClientRtnData = self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+        request = MCRequest(task=MCTask.SendFile, key=key, arg=file_path)
+        mcr: MessageClientRtnData = self._run(request, timeout=timeout, max_try=max_try)
         if not with_timestamp:
             return mcr
         else:
@@ -151,9 +127,8 @@ class MessageClient:
                 return mcr
 
     def sendmessage(self, key, message, timeout=5, max_try=5, with_timestamp: bool = False) -> MessageClientRtnData:
-        s_cmd = f'{MCTask.SendMessage.value} "{key}" "{message}"'
-        # self.logger.info(s_cmd)
-        mcr = self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+        request = MCRequest(task=MCTask.SendMessage, key=key, arg=str(message))
+        mcr = self._run(request, timeout=timeout, max_try=max_try)
         if not with_timestamp:
             return mcr
         else:
@@ -166,25 +141,23 @@ class MessageClient:
                     self.logger.error('send dt key fail')
                 return mcr
 
-    def _get_timestamp(self, key, gap) -> None or datetime:
+    def _get_timestamp(self, key, gap, timeout=5, max_try=5) -> None or datetime:
         dt_key = 'dt#' + key
-        dt_mcr = self.getmessage(key=dt_key)
-        if dt_mcr.exception:
-            self.logger.error('get timestamp fail')
-            return None
-        s_timestamp = str(dt_mcr.msg)
-        try:
-            dt_timestamp = datetime.strptime(s_timestamp, '%Y%m%d %H%M%S')
-        except Exception as e:
-            self.logger.error(f'timestamp error {e}')
-            return None
-        dt_now = datetime.now()
-        if (dt_now - dt_timestamp).seconds > gap:
-            self.logger.info(f'timestamp error,timestamp={dt_timestamp.strftime("%Y%m%d %H%M%S")}')
-            return None
-        else:
-            self.logger.info(f'timestamp pass,timestamp={dt_timestamp.strftime("%Y%m%d %H%M%S")}')
-            return dt_timestamp
+        dt_mcr = self.getmessage(key=dt_key, timeout=timeout, max_try=max_try)
+        return self._check_timestamp(dt_mcr, gap)
+
+    def _check_timestamp(self, dt_mcr: MessageClientRtnData, gap) -> None or datetime:
+        return check_timestamp(dt_mcr, gap, self.logger)
+
+    def _run_with_cache(self, request: MCRequest, key_dt: datetime, timeout=5, max_try=5) -> MessageClientRtnData:
+        """ dt# 时间戳未变化时使用缓存 """
+        mcr = get_cached_rtn_data(self.cache, request, key_dt)
+        if mcr is not None:
+            self.logger.info(f'cache hit, {request.key}')
+            return mcr
+        mcr = self._run(request, timeout=timeout, max_try=max_try)
+        put_cached_rtn_data(self.cache, request, key_dt, mcr)
+        return mcr
 
     def getfile(self, key, file_path, timeout=5, max_try=5,
                 with_timestamp_gap: int or None = None) -> MessageClientRtnData or None:
@@ -192,40 +165,75 @@ class MessageClient:
         if not os.path.isdir(os.path.dirname(file_path)):
             os.makedirs(os.path.dirname(file_path))
 
-        s_cmd = f'{MCTask.GetFile.value} "{key}" "{file_path}"'
-        self.logger.info(s_cmd)
+        request = MCRequest(task=MCTask.GetFile, key=key, arg=file_path)
+        self.logger.info(f'{request.task.value} "{key}" "{file_path}"')
         if not with_timestamp_gap:
-            return self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+            return self._run(request, timeout=timeout, max_try=max_try)
         else:
-            key_dt = self._get_timestamp(key=key, gap=with_timestamp_gap)
+            key_dt = self._get_timestamp(key=key, gap=with_timestamp_gap, timeout=timeout, max_try=max_try)
             if key_dt:
-                return self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+                return self._run_with_cache(request, key_dt, timeout=timeout, max_try=max_try)
             else:
                 return None
 
     def getmessage(self, key, timeout=5, max_try=5,
                    with_timestamp_gap: int or None = None) -> MessageClientRtnData or None:
-        s_cmd = f'{MCTask.GetMessage.value} "{key}"'
-        self.logger.info(s_cmd)
+        request = MCRequest(task=MCTask.GetMessage, key=key)
+        self.logger.info(f'{request.task.value} "{key}"')
         if not with_timestamp_gap:
-            return self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+            return self._run(request, timeout=timeout, max_try=max_try)
         else:
-            key_dt = self._get_timestamp(key=key, gap=with_timestamp_gap)
+            key_dt = self._get_timestamp(key=key, gap=with_timestamp_gap, timeout=timeout, max_try=max_try)
             if key_dt:
-                return self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+                return self._run_with_cache(request, key_dt, timeout=timeout, max_try=max_try)
             else:
                 return None
 
     def status(self, timeout=5, max_try=5) -> MessageClientRtnData:
-        s_cmd = f'{MCTask.Status.value} '
-        self.logger.info(s_cmd)
-        return self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
+        request = MCRequest(task=MCTask.Status)
+        self.logger.info(request.task.value)
+        return self._run(request, timeout=timeout, max_try=max_try)
 
     def clear(self, key, timeout=5, max_try=5) -> MessageClientRtnData:
-        s_cmd = f'{MCTask.Clear.value} "{key}" '
-        self.logger.info(s_cmd)
-        return self._run(cmd=s_cmd, timeout=timeout, max_try=max_try)
-
+        request = MCRequest(task=MCTask.Clear, key=key)
+        self.logger.info(f'{request.task.value} "{key}"')
+        return self._run(request, timeout=timeout, max_try=max_try)
+
+    # ========== 多个 key 并发 ==========
+    def getmessages_concurrently(self, keys: List[str], timeout=5, max_try=5,
+                 with_timestamp_gap: int or None = None) -> Dict[str, MessageClientRtnData]:
+        """
+        多个 key 的 getmessage 并发运行（不是批量请求）：
+            每个 key（以及 timestamp 模式下的 dt# key）仍是一个 exe 进程，最多 exe_workers 个同时运行
+        return {key: MessageClientRtnData}, 失败的 key exception 不为 None, msg 为错误信息；
+            timestamp 模式下 时间戳过期 / 读取失败 时 exception 为 RunException.Expired
+        """
+        keys = list(dict.fromkeys(keys))
+        self.logger.info(f'{MCTask.GetMessage.value} {len(keys)} keys')
+        l_rtn = self._run_many(
+            gen_getmessage_requests(keys, with_timestamp=bool(with_timestamp_gap)), timeout=timeout, max_try=max_try)
+        check = None
+        if with_timestamp_gap:
+            check = lambda dt_mcr: self._check_timestamp(dt_mcr, with_timestamp_gap)
+        return merge_getmessage_results(keys, l_rtn, check)
+
+    def sendmessages_concurrently(self, d_messages: Dict[str, str], timeout=5, max_try=5,
+                  with_timestamp: bool = False) -> Dict[str, MessageClientRtnData]:
+        """
+        多个 key 的 sendmessage 并发运行（不是批量请求），每个 key 一个 exe 进程
+        timestamp 模式下, 发送成功的 key 再并发发送 dt# key（与 sendmessage 相同，失败的 key 不更新时间戳）
+        return {key: MessageClientRtnData}
+        """
+        keys = list(d_messages.keys())
+        self.logger.info(f'{MCTask.SendMessage.value} {len(keys)} keys')
+        l_rtn = self._run_many(gen_sendmessage_requests(d_messages), timeout=timeout, max_try=max_try)
+        d_rtn = dict(zip(keys, l_rtn))
+        if with_timestamp:
+            l_succeed = [_key for _key in keys if not d_rtn[_key].exception]
+            l_rtn_dt = self._run_many(gen_send_timestamp_requests(l_succeed), timeout=timeout, max_try=max_try)
+            if any([_.exception for _ in l_rtn_dt]):
+                self.logger.error('send dt key fail')
+        return d_rtn
 
 
 """"""
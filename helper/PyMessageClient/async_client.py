@@ -0,0 +1,243 @@
+"""
+asyncio 版本的 MessageClient，接口与 MessageClient 相同（async）
+
+    mc = AsyncMessageClient(ip, port)
+    d_rtn = await mc.getmessages_concurrently(['key1', 'key2'], with_timestamp_gap=60)
+    await mc.close()
+
+exe
+    asyncio.create_subprocess_exec 调用 TradingPlatform.MessageClient.exe（MSServer 只支持 exe 客户端）
+max_concurrency
+    同时运行的 exe 进程数；
+    多个 client 可以传入同一个 semaphore，共用一个并发上限（semaphore 只能在一个 event loop 中使用）
+event loop
+    semaphore 属于创建它的 event loop；在新的 event loop 中使用时（例如每次 asyncio.run），重新创建 semaphore
+重试
+    失败的请求重试前等待随机的时间（指数退避 + 随机抖动），避免多个请求同时重试
+取消
+    任务被取消 / 超时时，终止并回收 exe 进程
+"""
+
+import os
+import random
+import asyncio
+import subprocess
+from datetime import datetime
+from typing import List, Dict
+import logging
+
+try:
+    from .simpleLogger import MyLogger
+    from .constant import RunException, MCTask, MessageClientRtnData
+    from .transport import (
+        MCRequest, gen_exe_args, parse_exe_output, RequestRetry, gen_timestamp_request,
+        gen_getmessage_requests, merge_getmessage_results, gen_sendmessage_requests, gen_send_timestamp_requests)
+    from .MessageClient import MessageClient, PATH_MC, PATH_MC_EXE
+    from .cache import TimestampCache, get_cached_rtn_data, put_cached_rtn_data
+except:
+    from simpleLogger import MyLogger
+    from constant import RunException, MCTask, MessageClientRtnData
+    from transport import (
+        MCRequest, gen_exe_args, parse_exe_output, RequestRetry, gen_timestamp_request,
+        gen_getmessage_requests, merge_getmessage_results, gen_sendmessage_requests, gen_send_timestamp_requests)
+    from MessageClient import MessageClient, PATH_MC, PATH_MC_EXE
+    from cache import TimestampCache, get_cached_rtn_data, put_cached_rtn_data
+
+
+class AsyncMessageClient:
+    def __init__(
+            self,
+            ip, port,
+            logger: logging.Logger or None = None,
+            max_concurrency=8,
+            semaphore: asyncio.Semaphore or None = None,    # 多个 client 共用的并发上限
+            retry_base_delay=0.2,       # 第n次重试前 最多等待 retry_base_delay * 2^n 秒
+            retry_max_delay=5.,
+            cache_ttl: float or None = None,        # 同 MessageClient
+            cache_size=256,
+            cache_bytes=64 * 1024 * 1024,
+    ):
+        assert os.path.isfile(PATH_MC_EXE)
+        self._ip = ip
+        self._port = port
+        if isinstance(logger, logging.Logger):
+            self.logger = logger
+        else:
+            self.logger = MyLogger(name='AsyncMessageClient')
+
+        self._max_concurrency = max_concurrency
+        self._semaphore = semaphore
+        self._shared_semaphore = semaphore is not None
+        self._loop: asyncio.AbstractEventLoop or None = None
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        self.cache: TimestampCache or None = None
+        if cache_ttl:
+            self.cache = TimestampCache(ttl=cache_ttl, max_size=cache_size, max_bytes=cache_bytes)
+
+    _check_timeout_arg = staticmethod(MessageClient._check_timeout_arg)
+    _check_maxtry_arg = staticmethod(MessageClient._check_maxtry_arg)
+    _check_timestamp = MessageClient._check_timestamp
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # 在 event loop 中创建
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    def _check_loop(self):
+        """ event loop 变化时，丢弃属于旧 loop 的 semaphore """
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        if self._loop is not None and not self._shared_semaphore:
+            self._semaphore = None
+        self._loop = loop
+
+    # ========== exe ==========
+    async def _run_exe(self, request: MCRequest, timeout) -> MessageClientRtnData:
+        async with self.semaphore:
+            p = await asyncio.create_subprocess_exec(
+                *gen_exe_args(PATH_MC_EXE, self._ip, self._port, request),
+                cwd=PATH_MC,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+            )
+            try:
+                outs, errs = await asyncio.wait_for(p.communicate(), timeout=timeout)
+                output_s = str(outs, encoding="utf-8")
+            except asyncio.TimeoutError as e:
+                p.kill()
+                await p.wait()
+                self.logger.error('调用 MessageClient 超时')
+                return MessageClientRtnData(datetime=datetime.now(), exception=RunException.TimeOut, msg=str(e))
+            except asyncio.CancelledError:
+                # 等待进程退出（不被再次取消），避免遗留进程
+                p.kill()
+                await asyncio.shield(p.wait())
+                raise
+            except Exception as e:
+                p.kill()
+                self.logger.error('调用 MessageClient 失败:')
+                self.logger.error(e)
+                return MessageClientRtnData(datetime=datetime.now(), exception=RunException.Error, msg=str(e))
+        rtn_data = parse_exe_output(output_s)
+        if rtn_data.exception:
+            self.logger.warning('调用 MessageClient 失败:')
+            self.logger.warning(output_s)
+        return rtn_data
+
+    # ========== 请求 ==========
+    async def _transport_run(self, l_requests: List[MCRequest], timeout) -> List[MessageClientRtnData]:
+        return list(await asyncio.gather(*[self._run_exe(_request, timeout) for _request in l_requests]))
+
+    async def _run_many(self, l_requests: List[MCRequest], timeout=5, max_try=5) -> List[MessageClientRtnData]:
+        """ 失败的请求 等待随机时间后重试，按顺序返回结果 """
+        timeout = self._check_timeout_arg(timeout, default=5)
+        max_try = self._check_maxtry_arg(max_try, default=5)
+        self._check_loop()
+
+        retry = RequestRetry(l_requests)
+        for n_try in range(max_try):
+            if n_try:
+                await asyncio.sleep(random.uniform(0, min(self._retry_max_delay, self._retry_base_delay * 2 ** n_try)))
+            l_rtn_data = await self._transport_run(retry.pending_requests(), timeout=timeout)
+            if retry.update(l_rtn_data, n_try, self.logger):
+                break
+        return retry.result(self.logger)
+
+    async def _run(self, request: MCRequest, timeout=5, max_try=5) -> MessageClientRtnData:
+        return (await self._run_many([request], timeout=timeout, max_try=max_try))[0]
+
+    async def _get_timestamp(self, key, gap, timeout=5, max_try=5) -> None or datetime:
+        dt_mcr = await self._run(gen_timestamp_request(key), timeout=timeout, max_try=max_try)
+        return self._check_timestamp(dt_mcr, gap)
+
+    async def _run_with_cache(self, request: MCRequest, key_dt: datetime, timeout=5, max_try=5) -> MessageClientRtnData:
+        """ dt# 时间戳未变化时使用缓存 """
+        mcr = get_cached_rtn_data(self.cache, request, key_dt)
+        if mcr is not None:
+            self.logger.info(f'cache hit, {request.key}')
+            return mcr
+        mcr = await self._run(request, timeout=timeout, max_try=max_try)
+        put_cached_rtn_data(self.cache, request, key_dt, mcr)
+        return mcr
+
+    async def close(self):
+        # 每个请求一个 exe 进程，没有需要释放的资源，保留以与 MessageClient 一致
+        pass
+
+    async def sendfile(self, key, file_path, timeout=5, max_try=5, with_timestamp: bool = False) -> MessageClientRtnData:
+        mcr = await self._run(MCRequest(task=MCTask.SendFile, key=key, arg=file_path), timeout=timeout, max_try=max_try)
+        if with_timestamp and not mcr.exception:
+            mcr_dt = await self.sendmessage(key='dt#' + key, message=datetime.now().strftime('%Y%m%d %H%M%S'))
+            if mcr_dt.exception:
+                self.logger.error('send dt key fail')
+        return mcr
+
+    async def sendmessage(self, key, message, timeout=5, max_try=5,
+                          with_timestamp: bool = False) -> MessageClientRtnData:
+        d_rtn = await self.sendmessages_concurrently(
+            {key: message}, timeout=timeout, max_try=max_try, with_timestamp=with_timestamp)
+        return d_rtn[key]
+
+    async def getfile(self, key, file_path, timeout=5, max_try=5,
+                      with_timestamp_gap: int or None = None) -> MessageClientRtnData or None:
+        file_path = os.path.abspath(file_path)
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        self.logger.info(f'{MCTask.GetFile.value} "{key}" "{file_path}"')
+        request = MCRequest(task=MCTask.GetFile, key=key, arg=file_path)
+        if not with_timestamp_gap:
+            return await self._run(request, timeout=timeout, max_try=max_try)
+        # 时间戳过期时不下载, 未变化时使用缓存
+        key_dt = await self._get_timestamp(key, with_timestamp_gap, timeout=timeout, max_try=max_try)
+        if not key_dt:
+            return None
+        return await self._run_with_cache(request, key_dt, timeout=timeout, max_try=max_try)
+
+    async def getmessage(self, key, timeout=5, max_try=5,
+                         with_timestamp_gap: int or None = None) -> MessageClientRtnData or None:
+        request = MCRequest(task=MCTask.GetMessage, key=key)
+        self.logger.info(f'{request.task.value} "{key}"')
+        if not with_timestamp_gap:
+            return await self._run(request, timeout=timeout, max_try=max_try)
+        # 同 getfile
+        key_dt = await self._get_timestamp(key, with_timestamp_gap, timeout=timeout, max_try=max_try)
+        if not key_dt:
+            return None
+        return await self._run_with_cache(request, key_dt, timeout=timeout, max_try=max_try)
+
+    async def status(self, timeout=5, max_try=5) -> MessageClientRtnData:
+        return await self._run(MCRequest(task=MCTask.Status), timeout=timeout, max_try=max_try)
+
+    async def clear(self, key, timeout=5, max_try=5) -> MessageClientRtnData:
+        return await self._run(MCRequest(task=MCTask.Clear, key=key), timeout=timeout, max_try=max_try)
+
+    # ========== 多个 key 并发 ==========
+    async def getmessages_concurrently(self, keys: List[str], timeout=5, max_try=5,
+                       with_timestamp_gap: int or None = None) -> Dict[str, MessageClientRtnData]:
+        """ 同 MessageClient.getmessages_concurrently """
+        keys = list(dict.fromkeys(keys))
+        self.logger.info(f'{MCTask.GetMessage.value} {len(keys)} keys')
+        l_rtn = await self._run_many(
+            gen_getmessage_requests(keys, with_timestamp=bool(with_timestamp_gap)), timeout=timeout, max_try=max_try)
+        check = None
+        if with_timestamp_gap:
+            check = lambda dt_mcr: self._check_timestamp(dt_mcr, with_timestamp_gap)
+        return merge_getmessage_results(keys, l_rtn, check)
+
+    async def sendmessages_concurrently(self, d_messages: Dict[str, str], timeout=5, max_try=5,
+                        with_timestamp: bool = False) -> Dict[str, MessageClientRtnData]:
+        """ 同 MessageClient.sendmessages_concurrently """
+        keys = list(d_messages.keys())
+        self.logger.info(f'{MCTask.SendMessage.value} {len(keys)} keys')
+        l_rtn = await self._run_many(gen_sendmessage_requests(d_messages), timeout=timeout, max_try=max_try)
+        d_rtn = dict(zip(keys, l_rtn))
+        if with_timestamp:
+            l_succeed = [_key for _key in keys if not d_rtn[_key].exception]
+            l_rtn_dt = await self._run_many(gen_send_timestamp_requests(l_succeed), timeout=timeout, max_try=max_try)
+            if any([_.exception for _ in l_rtn_dt]):
+                self.logger.error('send dt key fail')
+        return d_rtn
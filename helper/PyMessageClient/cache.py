@@ -0,0 +1,121 @@
+"""
+timestamp 模式下读取结果的本地缓存
+
+    每个 key 只保存最新的一个版本: (task, key) -> (dt# 时间戳, 内容, 缓存时间)
+    get 时 dt# 时间戳相同，且未超过 ttl，返回缓存的内容，不再下载；
+    超过 max_size 个 key 或 max_bytes 字节时，淘汰最久未使用的 key（LRU）。
+    dt# 时间戳精确到秒，同一秒内更新两次时，时间戳不变，ttl 限制了读到旧内容的时间。
+"""
+
+import os
+import threading
+from time import monotonic
+from datetime import datetime
+from collections import OrderedDict
+from typing import Tuple
+
+try:
+    from .constant import MCTask, MessageClientRtnData
+    from .transport import MCRequest
+except:
+    from constant import MCTask, MessageClientRtnData
+    from transport import MCRequest
+
+
+class TimestampCache:
+    def __init__(self, ttl=60., max_size=256, max_bytes=64 * 1024 * 1024):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        # {(task, key): (timestamp, value, 缓存时间)}
+        self._data: OrderedDict = OrderedDict()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @staticmethod
+    def _sizeof(value: str or bytes) -> int:
+        return len(value.encode('utf-8')) if isinstance(value, str) else len(value)
+
+    def get(self, key: Tuple[str, str], timestamp) -> str or bytes or None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] != timestamp or monotonic() - entry[2] > self._ttl:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], timestamp, value: str or bytes):
+        n_bytes = self._sizeof(value)
+        with self._lock:
+            self._pop(key)
+            if n_bytes > self._max_bytes:
+                return
+            self._data[key] = (timestamp, value, monotonic())
+            self._n_bytes += n_bytes
+            while len(self._data) > self._max_size or self._n_bytes > self._max_bytes:
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._n_bytes -= self._sizeof(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._n_bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        n = self.hits + self.misses
+        return self.hits / n if n else 0.
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'size': len(self._data),
+            'bytes': self._n_bytes,
+        }
+
+
+# ========== MessageClient / AsyncMessageClient 共用 ==========
+def get_cached_rtn_data(cache: TimestampCache or None, request: MCRequest, timestamp) -> MessageClientRtnData or None:
+    """ 命中缓存时 return 结果（getfile 时写入文件），否则 None """
+    if cache is None:
+        return None
+    value = cache.get((request.task.value, request.key), timestamp)
+    if value is None:
+        return None
+    if request.task == MCTask.GetFile:
+        path_file = os.path.abspath(request.arg)
+        # 文件内容相同时不重写
+        if os.path.isfile(path_file):
+            with open(path_file, 'rb') as f:
+                if f.read() == value:
+                    return MessageClientRtnData(datetime=datetime.now(), exception=None)
+        with open(path_file, 'wb') as f:
+            f.write(value)
+        return MessageClientRtnData(datetime=datetime.now(), exception=None)
+    return MessageClientRtnData(datetime=datetime.now(), exception=None, msg=value)
+
+
+def put_cached_rtn_data(cache: TimestampCache or None, request: MCRequest, timestamp, rtn_data: MessageClientRtnData):
+    if cache is None or rtn_data is None or rtn_data.exception:
+        return
+    if request.task == MCTask.GetFile:
+        path_file = os.path.abspath(request.arg)
+        if not os.path.isfile(path_file):
+            return
+        with open(path_file, 'rb') as f:
+            cache.put((request.task.value, request.key), timestamp, f.read())
+    else:
+        cache.put((request.task.value, request.key), timestamp, rtn_data.msg)
@@ -0,0 +1,32 @@
+from datetime import datetime
+from enum import Enum
+from dataclasses import dataclass
+
+
+# timestamp 模式: key 的更新时间保存在 dt#key 中
+TIMESTAMP_KEY_PREFIX = 'dt#'
+TIMESTAMP_FORMAT = '%Y%m%d %H%M%S'
+
+
+class RunException(Enum):
+    """
+    """
+    TimeOut = 0
+    Error = -1
+    Expired = -2        # timestamp 模式, 时间戳过期
+
+
+class MCTask(Enum):
+    SendFile = 'sendfile'
+    SendMessage = 'sendmessage'
+    GetFile = 'getfile'
+    GetMessage = 'getmessage'
+    Status = 'status'
+    Clear = 'clear'
+
+
+@dataclass
+class MessageClientRtnData:
+    datetime: datetime
+    exception: RunException or None
+    msg: str = ''
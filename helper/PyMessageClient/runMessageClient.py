@@ -50,7 +50,7 @@ kwargs = {}
 if args.timeout:
     kwargs['timeout'] = args.timeout
 if args.maxtry:
-    kwargs['maxtry'] = args.maxtry
+    kwargs['max_try'] = args.maxtry
 
 if args.function.lower() == 'getfile':
     key = args.key
@@ -0,0 +1,218 @@
+"""
+MessageClient 与 message server 之间的传输方式
+
+ExeTransport（默认）
+    每个请求调用一次 TradingPlatform.MessageClient.exe（不经过 shell，参数不需要转义）；
+    超时时 kill 并回收进程，不遗留 exe 进程；
+    MSServer 只支持 exe 客户端（.NET Remoting），没有可以直接连接的协议。
+    一次运行多个请求时，每个请求仍是一个 exe 进程，最多 max_workers 个并发运行（exe 不支持一次发送多个请求）。
+MessageTransport
+    其他传输方式（例如 测试中替代 exe）继承此类，传入 MessageClient(transport=...)
+"""
+
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dataclasses import dataclass
+from typing import List, Dict, Callable
+import logging
+
+try:
+    from .constant import MCTask, RunException, MessageClientRtnData, TIMESTAMP_KEY_PREFIX, TIMESTAMP_FORMAT
+except:
+    from constant import MCTask, RunException, MessageClientRtnData, TIMESTAMP_KEY_PREFIX, TIMESTAMP_FORMAT
+
+
+@dataclass
+class MCRequest:
+    task: MCTask
+    key: str = ''
+    arg: str = ''       # sendmessage: 消息; sendfile / getfile: 文件路径
+
+
+# 各任务的位置参数，空字符串也要传入，否则 exe 会读错参数
+EXE_TASK_ARGS = {
+    MCTask.SendFile: ('key', 'arg'),
+    MCTask.SendMessage: ('key', 'arg'),
+    MCTask.GetFile: ('key', 'arg'),
+    MCTask.GetMessage: ('key', ),
+    MCTask.Clear: ('key', ),
+    MCTask.Status: (),
+}
+
+
+def gen_exe_args(path_mc_exe, ip, port, request: MCRequest) -> List[str]:
+    return [path_mc_exe, str(ip), str(port), request.task.value] + \
+           [str(getattr(request, _)) for _ in EXE_TASK_ARGS[request.task]]
+
+
+def parse_exe_output(output_s: str) -> MessageClientRtnData:
+    """ TradingPlatform.MessageClient.exe 的输出 """
+    if 'Exception' in output_s:
+        return MessageClientRtnData(datetime=datetime.now(), exception=RunException.Error, msg=output_s)
+    return MessageClientRtnData(datetime=datetime.now(), exception=None, msg=output_s.split('<<')[-1].strip())
+
+
+# ========== MessageClient / AsyncMessageClient 共用 ==========
+class RequestRetry:
+    """
+    多个请求的重试记录：每次运行 pending_requests()，失败的请求下一次重试，结果按请求顺序保存在 l_rtn
+    """
+    def __init__(self, l_requests: List[MCRequest]):
+        self._l_requests = l_requests
+        self.l_rtn: List[MessageClientRtnData or None] = [None] * len(l_requests)
+        self.l_n_pending = list(range(len(l_requests)))
+
+    def pending_requests(self) -> List[MCRequest]:
+        return [self._l_requests[_] for _ in self.l_n_pending]
+
+    def update(self, l_rtn_data: List[MessageClientRtnData], n_try: int, logger: logging.Logger) -> bool:
+        """ l_rtn_data: pending_requests() 的结果; return 是否全部成功 """
+        l_n_failed = []
+        for n, rtn_data in zip(self.l_n_pending, l_rtn_data):
+            self.l_rtn[n] = rtn_data
+            if rtn_data.exception:
+                l_n_failed.append(n)
+        if not l_n_failed:
+            self.l_n_pending = []
+            return True
+        if len(self._l_requests) == 1:
+            if self.l_rtn[0].exception == RunException.TimeOut:
+                logger.error(f'第{n_try+1}次运行，超时')
+            else:
+                logger.error(f'第{n_try + 1}次运行，失败')
+        else:
+            logger.error(f'第{n_try + 1}次运行，{len(l_n_failed)}/{len(self.l_n_pending)} 个请求失败')
+        self.l_n_pending = l_n_failed
+        return False
+
+    def result(self, logger: logging.Logger) -> List[MessageClientRtnData]:
+        """ 超过最大运行次数时，仍失败的请求 exception 为 RunException.Error """
+        if self.l_n_pending:
+            logger.error('超过最大运行次数')
+        for n in self.l_n_pending:
+            self.l_rtn[n] = MessageClientRtnData(
+                datetime=datetime.now(), exception=RunException.Error, msg=self.l_rtn[n].msg)
+        return self.l_rtn
+
+
+def check_timestamp(dt_mcr: MessageClientRtnData, gap, logger: logging.Logger) -> None or datetime:
+    """ dt# key 的返回值, 时间戳在 gap(s) 之内时 return 时间戳 """
+    if dt_mcr.exception:
+        logger.error('get timestamp fail')
+        return None
+    s_timestamp = str(dt_mcr.msg)
+    try:
+        dt_timestamp = datetime.strptime(s_timestamp, TIMESTAMP_FORMAT)
+    except Exception as e:
+        logger.error(f'timestamp error {e}')
+        return None
+    dt_now = datetime.now()
+    if (dt_now - dt_timestamp).total_seconds() > gap:
+        logger.info(f'timestamp error,timestamp={dt_timestamp.strftime(TIMESTAMP_FORMAT)}')
+        return None
+    else:
+        logger.info(f'timestamp pass,timestamp={dt_timestamp.strftime(TIMESTAMP_FORMAT)}')
+        return dt_timestamp
+
+
+def gen_timestamp_request(key) -> MCRequest:
+    return MCRequest(task=MCTask.GetMessage, key=TIMESTAMP_KEY_PREFIX + key)
+
+
+def gen_getmessage_requests(keys: List[str], with_timestamp: bool) -> List[MCRequest]:
+    """ 各 key 的 getmessage 请求，with_timestamp 时 后面再加上各 key 的 dt# 请求 """
+    l_requests = [MCRequest(task=MCTask.GetMessage, key=_key) for _key in keys]
+    if with_timestamp:
+        l_requests += [gen_timestamp_request(_key) for _key in keys]
+    return l_requests
+
+
+def merge_getmessage_results(
+        keys: List[str], l_rtn: List[MessageClientRtnData],
+        check: Callable[[MessageClientRtnData], datetime or None] or None = None,
+) -> Dict[str, MessageClientRtnData]:
+    """
+    gen_getmessage_requests 的结果 -> {key: MessageClientRtnData}
+    check: timestamp 模式下检查 dt# 的结果，return None 时 key 的 exception 为 RunException.Expired
+    """
+    d_rtn = dict(zip(keys, l_rtn[:len(keys)]))
+    if check is None:
+        return d_rtn
+    for _key, dt_mcr in zip(keys, l_rtn[len(keys):]):
+        if d_rtn[_key].exception:
+            continue
+        if check(dt_mcr) is None:
+            d_rtn[_key] = MessageClientRtnData(
+                datetime=dt_mcr.datetime, exception=RunException.Expired,
+                msg=f'timestamp error, {TIMESTAMP_KEY_PREFIX}{_key}: {dt_mcr.msg}')
+    return d_rtn
+
+
+def gen_sendmessage_requests(d_messages: Dict[str, str]) -> List[MCRequest]:
+    return [MCRequest(task=MCTask.SendMessage, key=_key, arg=str(_message))
+            for _key, _message in d_messages.items()]
+
+
+def gen_send_timestamp_requests(keys: List[str]) -> List[MCRequest]:
+    """ 发送成功的 keys 的 dt# 请求，时间戳为当前时间 """
+    s_timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+    return [MCRequest(task=MCTask.SendMessage, key=TIMESTAMP_KEY_PREFIX + _key, arg=s_timestamp) for _key in keys]
+
+
+class MessageTransport:
+    def run(self, l_requests: List[MCRequest], timeout: float) -> List[MessageClientRtnData]:
+        """ 按顺序返回每个请求的结果 """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ExeTransport(MessageTransport):
+    def __init__(self, ip, port, path_mc, path_mc_exe, logger: logging.Logger, max_workers=8):
+        self._ip = str(ip)
+        self._port = str(port)
+        self._path_mc = path_mc
+        self._path_mc_exe = path_mc_exe
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix='MessageClientExe')
+
+    def run(self, l_requests: List[MCRequest], timeout: float) -> List[MessageClientRtnData]:
+        if len(l_requests) <= 1:
+            return [self._run_one(_request, timeout) for _request in l_requests]
+        # 并发运行，按请求顺序返回
+        return list(self._executor.map(lambda _request: self._run_one(_request, timeout), l_requests))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _run_one(self, request: MCRequest, timeout) -> MessageClientRtnData:
+        l_args = gen_exe_args(self._path_mc_exe, self._ip, self._port, request)
+        p = subprocess.Popen(
+            l_args,
+            cwd=self._path_mc,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+        )
+        try:
+            outs, errs = p.communicate(timeout=timeout)
+            output_s = str(outs, encoding="utf-8")
+        except subprocess.TimeoutExpired as e:
+            p.kill()
+            p.communicate()
+            self.logger.error('调用 MessageClient 超时:')
+            self.logger.error(e)
+            return MessageClientRtnData(datetime=datetime.now(), exception=RunException.TimeOut, msg=str(e))
+        except Exception as e:
+            p.kill()
+            self.logger.error('调用 MessageClient 失败:')
+            self.logger.error(e)
+            return MessageClientRtnData(datetime=datetime.now(), exception=RunException.Error, msg=str(e))
+        rtn_data = parse_exe_output(output_s)
+        if rtn_data.exception:
+            self.logger.warning('调用 MessageClient 失败:')
+            self.logger.warning(output_s)
+        else:
+            self.logger.debug(output_s)
+        return rtn_data
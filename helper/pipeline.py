@@ -0,0 +1,238 @@
+"""
+按依赖关系运行的任务流水线
+
+PipelineStage
+    一个步骤：bat / 命令（子进程，等待退出、读取输出、超时终止）或 python 函数；
+    depends_on 中的步骤全部成功（exit code 0）后才运行，否则跳过。
+PipelineExecutor
+    submit()    在后台线程中运行一个循环（cycle），不阻塞调用方；
+                上一个循环仍在运行时，不会重叠运行：
+                    coalesce=True   合并为一个待运行的循环，当前循环结束后立即运行（多次请求只运行一次）
+                    coalesce=False  直接跳过
+    没有依赖关系的步骤并发运行。
+    每个循环记录各步骤的 开始时间 / 耗时 / exit code，保存在 history 中，并输出到日志。
+"""
+
+import os
+import subprocess
+import threading
+import logging
+from time import perf_counter
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass, field
+from typing import List, Dict, Callable
+
+
+@dataclass
+class StageResult:
+    name: str
+    start: datetime or None = None
+    seconds: float = 0.
+    returncode: int or None = None      # None: 超时被终止 / 未运行
+    skipped: bool = False               # 依赖的步骤失败，未运行
+    output: str = ''                    # 输出的最后几行
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    def __str__(self):
+        if self.skipped:
+            return f'{self.name}: skipped'
+        return f'{self.name}: exit {self.returncode}, {self.seconds:.2f}s'
+
+
+@dataclass
+class CycleResult:
+    n: int
+    start: datetime
+    seconds: float = 0.
+    stages: List[StageResult] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return all([_.ok for _ in self.stages])
+
+    def __str__(self):
+        return f'cycle {self.n} {"ok" if self.ok else "failed"} in {self.seconds:.2f}s; ' + \
+               '; '.join([str(_) for _ in self.stages])
+
+
+class PipelineStage:
+    def __init__(
+            self,
+            name: str,
+            command: List[str] or None = None,      # 子进程命令
+            func: Callable or None = None,          # 或者 python 函数，抛出异常视为失败
+            depends_on: List[str] or None = None,
+            timeout: float or None = 120,           # 子进程超时时间(s)，超时后终止进程树
+            output_lines=20,                        # 保留的输出行数
+    ):
+        assert (command is None) != (func is None)
+        self.name = name
+        self.command = command
+        self.func = func
+        self.depends_on = depends_on or []
+        self.timeout = timeout
+        self._output_lines = output_lines
+
+    @classmethod
+    def bat(cls, name, path_bat, **kwargs):
+        return cls(name=name, command=['cmd', '/c', path_bat], **kwargs)
+
+    def run(self) -> StageResult:
+        result = StageResult(name=self.name, start=datetime.now())
+        _t_start = perf_counter()
+        if self.func is not None:
+            try:
+                self.func()
+                result.returncode = 0
+            except Exception as e:
+                result.returncode = 1
+                result.output = str(e)
+        else:
+            result.returncode, result.output = self._run_command()
+        result.seconds = perf_counter() - _t_start
+        return result
+
+    def _run_command(self) -> (int or None, str):
+        # stdin 为空，bat 中的 pause 不会阻塞
+        proc = subprocess.Popen(
+            self.command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            output, _ = proc.communicate(timeout=self.timeout)
+            returncode = proc.returncode
+        except subprocess.TimeoutExpired:
+            self._kill(proc)
+            output, _ = proc.communicate()
+            returncode = None
+        output = output.decode(errors='replace') if output else ''
+        return returncode, '\n'.join(output.strip().splitlines()[-self._output_lines:])
+
+    @staticmethod
+    def _kill(proc: subprocess.Popen):
+        # bat 中启动的 python 进程 也要结束
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            proc.kill()
+
+
+class PipelineExecutor:
+    def __init__(
+            self,
+            stages: List[PipelineStage],
+            logger: logging.Logger = logging.Logger('PipelineExecutor'),
+            coalesce=True,
+            history_size=100,
+    ):
+        self._stages = self._sort_stages(stages)
+        self.logger = logger
+        self._coalesce = coalesce
+
+        self._lock = threading.Lock()
+        self._cycle_thread: threading.Thread or None = None
+        self._is_running = False
+        self._is_pending = False
+        self._n_cycle = 0
+        self.skipped_cycles = 0         # 因上一个循环仍在运行，被跳过 / 合并的请求数
+        self.history: deque = deque(maxlen=history_size)
+
+        self._executor = ThreadPoolExecutor(max_workers=max(len(stages), 1), thread_name_prefix='PipelineStage')
+
+    @staticmethod
+    def _sort_stages(stages: List[PipelineStage]) -> List[PipelineStage]:
+        """ 拓扑排序，依赖的步骤在前 """
+        d_stages = {_.name: _ for _ in stages}
+        l_sorted, s_visiting, s_done = [], set(), set()
+
+        def _visit(name):
+            if name in s_done:
+                return
+            if name in s_visiting:
+                raise Exception(f'pipeline 循环依赖: {name}')
+            if name not in d_stages:
+                raise Exception(f'pipeline 没有此步骤: {name}')
+            s_visiting.add(name)
+            for _dep in d_stages[name].depends_on:
+                _visit(_dep)
+            s_visiting.remove(name)
+            s_done.add(name)
+            l_sorted.append(d_stages[name])
+
+        for _stage in stages:
+            _visit(_stage.name)
+        return l_sorted
+
+    @property
+    def is_running(self) -> bool:
+        return self._is_running
+
+    def submit(self) -> bool:
+        """ 请求运行一个循环, return 是否立即开始 """
+        with self._lock:
+            if self._is_running:
+                self.skipped_cycles += 1
+                if self._coalesce:
+                    self._is_pending = True
+                    self.logger.warning('previous cycle still running, coalescing')
+                else:
+                    self.logger.warning('previous cycle still running, skipping')
+                return False
+            self._is_running = True
+        self._cycle_thread = threading.Thread(target=self._cycle_loop, daemon=True)
+        self._cycle_thread.start()
+        return True
+
+    def join(self, timeout=None):
+        """ 等待当前（以及合并的）循环结束 """
+        if self._cycle_thread is not None:
+            self._cycle_thread.join(timeout)
+
+    def _cycle_loop(self):
+        while True:
+            try:
+                self.run_cycle()
+            except Exception as e:
+                self.logger.error(f'pipeline cycle error: {e}')
+            with self._lock:
+                if not self._is_pending:
+                    self._is_running = False
+                    return
+                self._is_pending = False
+
+    def run_cycle(self) -> CycleResult:
+        """ 运行一个循环（阻塞） """
+        self._n_cycle += 1
+        cycle = CycleResult(n=self._n_cycle, start=datetime.now())
+        _t_start = perf_counter()
+        d_futures: Dict[str, Future] = {}
+        # 按拓扑顺序提交，每个步骤先等待其依赖的步骤
+        for _stage in self._stages:
+            d_futures[_stage.name] = self._executor.submit(
+                self._run_stage, _stage, [d_futures[_] for _ in _stage.depends_on])
+        cycle.stages = [d_futures[_stage.name].result() for _stage in self._stages]
+        cycle.seconds = perf_counter() - _t_start
+
+        self.history.append(cycle)
+        if cycle.ok:
+            self.logger.info(str(cycle))
+        else:
+            self.logger.error(str(cycle))
+            for _result in cycle.stages:
+                if not _result.ok and not _result.skipped and _result.output:
+                    self.logger.error(f'{_result.name} output:\n{_result.output}')
+        return cycle
+
+    @staticmethod
+    def _run_stage(stage: PipelineStage, l_dep_futures: List[Future]) -> StageResult:
+        if not all([_.result().ok for _ in l_dep_futures]):
+            return StageResult(name=stage.name, skipped=True)
+        return stage.run()
+
+    def close(self):
+        self.join()
+        self._executor.shutdown(wait=False)
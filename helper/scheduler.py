@@ -1,7 +1,9 @@
 import datetime
-import time
 import abc
+import heapq
+import itertools
 import threading
+from typing import List, Tuple, Callable
 
 import logging
 
@@ -12,20 +14,52 @@ class ScheduleRunner:
         一条线程（_scheduler_thread）负责判断是否处于运行时间，并传递到变量中（_schedule_in_running），
         启动任务 _start_schedule
         结束任务 _end_schedule
+
+    事件驱动：
+        线程维护一个定时器堆（call_at / call_later），不再每隔 schedule_checking_interval 轮询；
+        计算下一个运行时间区间的边界（开始 / 结束），一直休眠到该时间点，再切换状态并安排下一个边界；
+        running_time 中 开始时间 > 结束时间 的区间表示跨越午夜，如 [21:00, 02:30]；
+        结束时间包含该秒，[0:00, 23:59:59] 视为全天连续运行。
+        session_provider 不为空时代替 running_time，按自然日给出运行时间区间 [开始, 结束)，
+        例如 helper.trading_calendar.TradingCalendar.sessions_on（交易时间、跳过假期）。
+    任务线程中用 wait(interval) 代替 sleep(interval)：
+        运行时间结束 或 stop() 时立即返回，返回值为是否仍在运行时间中；interval 可以小于 1 秒。
+        stop() 之后 schedule_in_running 立即为 False，任务线程的循环不会在调度线程处理 stop 之前空转。
+    定时器 callback 出错时只记录日志，调度线程继续运行；
+    运行时间边界的切换出错时（例如 session_provider 读取失败、_start_task 出错），_RETRY_SECONDS 秒后重试。
     """
+    # 最长的休眠时间，避免系统时间被调整后 长时间不醒来
+    _MAX_WAIT_SECONDS = 600
+    # 查找下一个边界的天数（长假）
+    _BOUNDARY_SEARCH_DAYS = 14
+    # 切换运行状态出错后，重试的间隔
+    _RETRY_SECONDS = 60
+
     def __init__(
             self,
             running_time=[[datetime.time(0, 0, 0), datetime.time(23, 59, 59)], ],
-            schedule_checking_interval=60 * 1,
-            logger=logging.Logger('ScheduleRunner')
+            schedule_checking_interval=60 * 1,      # 已不用于轮询，保留参数
+            logger=logging.Logger('ScheduleRunner'),
+            session_provider: Callable[[datetime.date], List[Tuple[datetime.datetime, datetime.datetime]]] or None = None,
          ):
         self._schedule_running_time = running_time
+        self._session_provider = session_provider
         self._schedule_checking_interval = schedule_checking_interval
 
-        self.schedule_in_running = False
+        self._schedule_in_running = False
         self._scheduler_guard_thread = threading.Thread(target=self._scheduler_guard)
         self.logger = logger
 
+        # 定时器堆 [(触发时间, 序号, callback), ]
+        self._timers: List[Tuple[datetime.datetime, int, Callable]] = []
+        self._timer_seq = itertools.count()
+        self._timer_cond = threading.Condition()
+        # 停止
+        self._stop_event = threading.Event()
+        # 不在运行时间中（或已停止）时 set，用于唤醒 wait()
+        self._out_of_session_event = threading.Event()
+        self._out_of_session_event.set()
+
     @abc.abstractmethod
     def start(self):
         self._scheduler_guard_thread.start()
@@ -52,33 +86,136 @@ class ScheduleRunner:
     def _task_processing_loop(self):
         pass
 
+    # ========== 运行时间区间 ==========
+    def _sessions_on(self, d: datetime.date) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """ 自然日 d 开始的 运行时间区间 [开始, 结束)，跨午夜的区间结束于第二天 """
+        if self._session_provider is not None:
+            return self._session_provider(d)
+        l_sessions = []
+        for _start, _end in self._schedule_running_time:
+            dt_start = datetime.datetime.combine(d, _start)
+            dt_end = datetime.datetime.combine(d, _end) + datetime.timedelta(seconds=1)
+            if _end < _start:
+                dt_end += datetime.timedelta(days=1)
+            l_sessions.append((dt_start, dt_end))
+        return l_sessions
+
+    def _iter_session_ranges(self, dt: datetime.datetime, days_after=1):
+        """ dt 前一天 至 后 days_after 天 的运行时间区间 """
+        for n in range(-1, days_after + 1):
+            for _range in self._sessions_on(dt.date() + datetime.timedelta(days=n)):
+                yield _range
+
+    def is_in_session(self, dt: datetime.datetime or None = None) -> bool:
+        dt = dt or datetime.datetime.now()
+        return any([dt_start <= dt < dt_end for dt_start, dt_end in self._iter_session_ranges(dt)])
+
+    def next_session_boundary(self, dt: datetime.datetime or None = None) -> datetime.datetime or None:
+        """ dt 之后，运行状态发生变化的第一个时间点；没有运行时间区间时为 None """
+        dt = dt or datetime.datetime.now()
+        is_in_session = self.is_in_session(dt)
+        l_points = sorted(set([
+            _point
+            for _range in self._iter_session_ranges(dt, days_after=self._BOUNDARY_SEARCH_DAYS)
+            for _point in _range
+            if _point > dt
+        ]))
+        for _point in l_points:
+            if self.is_in_session(_point) != is_in_session:
+                return _point
+        return None
+
+    # ========== 定时器 ==========
+    def call_at(self, dt: datetime.datetime, callback: Callable):
+        """ 在 dt 时，在调度线程中运行 callback """
+        with self._timer_cond:
+            heapq.heappush(self._timers, (dt, next(self._timer_seq), callback))
+            self._timer_cond.notify_all()
+
+    def call_later(self, seconds: float, callback: Callable):
+        self.call_at(datetime.datetime.now() + datetime.timedelta(seconds=seconds), callback)
+
+    @property
+    def schedule_in_running(self) -> bool:
+        # stop() 之后立即为 False
+        return self._schedule_in_running and not self._stop_event.is_set()
+
+    def wait(self, seconds: float) -> bool:
+        """ 任务线程中代替 sleep；运行时间结束或停止时立即返回。return 是否仍在运行时间中 """
+        if self._stop_event.is_set():
+            return False
+        self._out_of_session_event.wait(seconds)
+        return self.schedule_in_running
+
+    def stop(self):
+        self._stop_event.set()
+        self._out_of_session_event.set()
+        with self._timer_cond:
+            self._timer_cond.notify_all()
+
+    # ========== 调度线程 ==========
+    def _run_callback(self, callback: Callable):
+        try:
+            callback()
+        except Exception as e:
+            self.logger.error(f'scheduler callback error: {e}')
+
+    def _on_session_boundary(self):
+        try:
+            self._switch_session_state()
+            # 下一个边界
+            dt_next = self.next_session_boundary()
+            if dt_next is None:
+                # 之后一段时间内都没有运行时间（或一直在运行），一天后再检查
+                dt_next = datetime.datetime.now() + datetime.timedelta(days=1)
+        except Exception as e:
+            # 出错时也要安排下一次检查，否则之后一直停留在当前状态
+            self.logger.error(f'session boundary error: {e}')
+            dt_next = datetime.datetime.now() + datetime.timedelta(seconds=self._RETRY_SECONDS)
+        self.call_at(dt_next, self._on_session_boundary)
+
+    def _switch_session_state(self):
+        if self._stop_event.is_set():
+            return
+        is_in_running_time = self.is_in_session()
+        # 开始
+        if (not self._schedule_in_running) and is_in_running_time:
+            self._schedule_in_running = True
+            self._out_of_session_event.clear()
+            self.logger.info('开始运行...')
+            try:
+                self._start_task()
+            except Exception:
+                # 下一次重试时重新开始
+                self._schedule_in_running = False
+                self._out_of_session_event.set()
+                raise
+        # 结束运行
+        elif self._schedule_in_running and (not is_in_running_time):
+            self._stop_running()
+
+    def _stop_running(self):
+        self._schedule_in_running = False
+        self._out_of_session_event.set()
+        self.logger.info('暂停运行...')
+        self._end_task()
+
     def _scheduler_guard(self):
         print('启动运行...')
         print('等待进入运行时间区间')
-        # 初始化，用于检查上一次上传的时间，防止长时间没有上传
-        while True:
-            time_now = datetime.datetime.now().time()
-            is_in_running_time = True in [
-                (time_now >= time_range[0]) and (time_now <= time_range[1])
-                for time_range in self._schedule_running_time
-            ]
-
-            # 运行时间中
-            if self.schedule_in_running and is_in_running_time:
-                pass
-            # 不在运行时间
-            elif (not self.schedule_in_running) and (not is_in_running_time):
-                pass
-            # 开始
-            elif (not self.schedule_in_running) and is_in_running_time:
-                self.schedule_in_running = True
-                self.logger.info('开始运行...')
-                self._start_task()
-            # 结束运行
-            else:
-                self.schedule_in_running = False
-                self.logger.info('暂停运行...')
-                self._end_task()
-
-            #
-            time.sleep(self._schedule_checking_interval)
+        self._run_callback(self._on_session_boundary)
+        while not self._stop_event.is_set():
+            with self._timer_cond:
+                if self._timers:
+                    _wait = (self._timers[0][0] - datetime.datetime.now()).total_seconds()
+                else:
+                    _wait = self._MAX_WAIT_SECONDS
+                if _wait > 0:
+                    # 休眠到 下一个定时器 / 新增定时器 / stop
+                    self._timer_cond.wait(min(_wait, self._MAX_WAIT_SECONDS))
+                    continue
+                _, _, callback = heapq.heappop(self._timers)
+            self._run_callback(callback)
+        # 停止
+        if self._schedule_in_running:
+            self._run_callback(self._stop_running)
@@ -0,0 +1,75 @@
+"""
+版本化的输出目录
+
+输出目录 root 的结构:
+    root/
+        current                     # 记录当前版本目录名，原子替换
+        20240101_093000_000000/     # 版本目录，写完后才会被 current 指向
+        20240101_093015_000000/
+
+写入方: 在新的版本目录中写完全部文件后，再原子替换 current；只保留最新的 keep 个版本（双缓冲）
+读取方: resolve_snapshot_dir(root) 得到 current 指向的版本目录，
+        不会读到正在重建的目录，也不会读到写了一半的文件
+"""
+
+import os
+import shutil
+from datetime import datetime
+from contextlib import contextmanager
+
+from pyptools.common.common_util import atomic_open
+
+
+CURRENT_FILE_NAME = 'current'
+
+
+def resolve_snapshot_dir(root) -> str:
+    """ root/current 指向的版本目录; 没有 current 文件时（旧的输出方式）返回 root 本身 """
+    p_current = os.path.join(root, CURRENT_FILE_NAME)
+    if not os.path.isfile(p_current):
+        return root
+    with open(p_current, encoding='utf-8') as f:
+        version = f.read().strip()
+    if not version:
+        return root
+    return os.path.join(root, version)
+
+
+def _prune(root, keep):
+    l_versions = sorted([
+        _name for _name in os.listdir(root)
+        if os.path.isdir(os.path.join(root, _name))
+    ])
+    for _name in l_versions[:-keep]:
+        # windows 下文件仍被读取时删除失败，留到下一次再删
+        shutil.rmtree(os.path.join(root, _name), ignore_errors=True)
+    # 旧的输出方式，直接写在 root 下的文件
+    for _name in os.listdir(root):
+        p = os.path.join(root, _name)
+        if os.path.isfile(p) and _name != CURRENT_FILE_NAME and not _name.startswith('.'):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+@contextmanager
+def new_snapshot_dir(root, keep=2):
+    """
+    with new_snapshot_dir(root) as p_dir:
+        写入文件到 p_dir
+    with 语句正常结束后 current 指向 p_dir；出错时删除 p_dir，current 不变
+    """
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    version = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    p_version = os.path.join(root, version)
+    os.makedirs(p_version)
+    try:
+        yield p_version
+    except BaseException:
+        shutil.rmtree(p_version, ignore_errors=True)
+        raise
+    with atomic_open(os.path.join(root, CURRENT_FILE_NAME), 'w', encoding='utf-8') as f:
+        f.write(version)
+    _prune(root, keep=max(int(keep), 1))
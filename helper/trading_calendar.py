@@ -0,0 +1,98 @@
+"""
+交易日历
+
+由 TradingSession.csv（各品种的 日盘 / 夜盘 交易时间）和 Holiday.csv（各交易所的假期）
+得到每个自然日中需要运行的时间区间，用作 ScheduleRunner 的 session_provider：
+    ScheduleRunner(session_provider=TradingCalendar(...).sessions_on)
+
+    交易日: 非周末，且不在该交易所的假期中
+    日盘:   交易日 当天
+    夜盘:   交易日 当天晚上，且下一个工作日（跳过周末）也是交易日（长假前一天晚上没有夜盘）；
+            结束时间早于开始时间，或开始时间在中午之前的时间段，属于第二天凌晨
+    各品种的时间区间 合并（并集），开始前 pre_open，结束后 post_close 仍在运行
+"""
+
+from datetime import datetime, date, time, timedelta
+from typing import Dict, List, Tuple
+
+from pyptools.common.object import Product, HolidayFile
+from pyptools.common.trading_session import TradingSessionFile, TradingSessionDataSet
+from pyptools.common.general_ticker_info import GeneralTickerInfoFile
+
+
+class TradingCalendar:
+    def __init__(
+            self,
+            trading_session: TradingSessionDataSet,
+            d_holidays: Dict[str, List[date]],      # {exchange: [date, ]}
+            l_products: List[Product] or None = None,       # 为 None 时使用 TradingSession 中的全部品种
+            pre_open=timedelta(minutes=0),
+            post_close=timedelta(minutes=2),
+    ):
+        self._trading_session = trading_session
+        self._d_holidays = {_exchange: set(_l_dates) for _exchange, _l_dates in d_holidays.items()}
+        self._l_products = l_products if l_products is not None else trading_session.products
+        self._pre_open = pre_open
+        self._post_close = post_close
+        # {date: [(start, end), ]}
+        self._cache: Dict[date, List[Tuple[datetime, datetime]]] = {}
+
+    @classmethod
+    def from_files(cls, path_trading_session, path_holiday, path_ticker_info='', **kwargs):
+        """ path_ticker_info 不为空时，只使用 GeneralTickerInfo 中的品种 """
+        l_products = None
+        if path_ticker_info:
+            l_products = list(GeneralTickerInfoFile.read(path_ticker_info).keys())
+        return cls(
+            trading_session=TradingSessionFile.read(path_trading_session),
+            d_holidays=HolidayFile.read(path_holiday),
+            l_products=l_products,
+            **kwargs
+        )
+
+    def is_trading_day(self, exchange: str, d: date) -> bool:
+        if d.weekday() >= 5:
+            return False
+        return d not in self._d_holidays.get(exchange, set())
+
+    def _has_night_session(self, exchange: str, d: date) -> bool:
+        if not self.is_trading_day(exchange, d):
+            return False
+        _next = d + timedelta(days=1)
+        while _next.weekday() >= 5:
+            _next += timedelta(days=1)
+        return self.is_trading_day(exchange, _next)
+
+    def product_sessions_on(self, product: Product, d: date) -> List[Tuple[datetime, datetime]]:
+        """ 品种在自然日 d 开始的交易时间段 """
+        _ts = self._trading_session.get_data(product, d)
+        if _ts is None:
+            return []
+        l_sessions = []
+        if self.is_trading_day(product.exchange, d):
+            for _start, _end in _ts.TradingSession:
+                l_sessions.append((datetime.combine(d, _start), datetime.combine(d, _end)))
+        if self._has_night_session(product.exchange, d):
+            for _start, _end in _ts.NightSession:
+                _start_date = d + timedelta(days=1) if _start < time(12, 0, 0) else d
+                _end_date = _start_date + timedelta(days=1) if _end < _start else _start_date
+                l_sessions.append((datetime.combine(_start_date, _start), datetime.combine(_end_date, _end)))
+        return l_sessions
+
+    def sessions_on(self, d: date) -> List[Tuple[datetime, datetime]]:
+        """ 自然日 d 开始的运行时间区间（各品种的并集，已合并重叠的区间） """
+        if d in self._cache:
+            return self._cache[d]
+        l_sessions = sorted([
+            (_start - self._pre_open, _end + self._post_close)
+            for _product in self._l_products
+            for _start, _end in self.product_sessions_on(_product, d)
+        ])
+        l_merged: List[Tuple[datetime, datetime]] = []
+        for _start, _end in l_sessions:
+            if l_merged and _start <= l_merged[-1][1]:
+                l_merged[-1] = (l_merged[-1][0], max(l_merged[-1][1], _end))
+            else:
+                l_merged.append((_start, _end))
+        self._cache[d] = l_merged
+        return l_merged
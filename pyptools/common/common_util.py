@@ -1,4 +1,8 @@
 import os
+import gzip
+import tempfile
+from time import sleep
+from contextlib import contextmanager
 from datetime import datetime, date, time, timedelta
 from typing import List, Dict
 
@@ -89,3 +93,48 @@ def gen_list_diff(l1, l2) -> list:
             if len(l2) == 0:
                 l3.append(i)
     return l3
+
+
+def replace_file(src, dst, max_try=20, retry_interval=0.05):
+    """
+    os.replace, 原子替换;
+    windows 下目标文件正被其他进程打开时会 PermissionError，短暂等待后重试
+    """
+    for n in range(max_try):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if n == max_try - 1:
+                raise
+            sleep(retry_interval)
+
+
+@contextmanager
+def atomic_open(p, mode='w', encoding='utf-8', newline=None, compress=False):
+    """
+    先写入同目录下的临时文件，写完后再替换目标文件；
+    读取方要么读到旧文件，要么读到完整的新文件，不会读到空文件或写了一半的文件。
+    写入出错时删除临时文件，目标文件保持不变。
+    :param compress: gzip 压缩
+    """
+    p = os.path.abspath(p)
+    root = os.path.dirname(p)
+    if not os.path.isdir(root):
+        os.makedirs(root)
+    fd, p_tmp = tempfile.mkstemp(prefix=f'.{os.path.basename(p)}.', suffix='.tmp', dir=root)
+    os.close(fd)
+    try:
+        if 'b' in mode:
+            f = gzip.open(p_tmp, mode) if compress else open(p_tmp, mode)
+        elif compress:
+            f = gzip.open(p_tmp, mode.replace('t', '') + 't', encoding=encoding, newline=newline)
+        else:
+            f = open(p_tmp, mode, encoding=encoding, newline=newline)
+        with f:
+            yield f
+        replace_file(p_tmp, p)
+    except BaseException:
+        if os.path.exists(p_tmp):
+            os.remove(p_tmp)
+        raise
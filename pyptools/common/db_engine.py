@@ -0,0 +1,161 @@
+"""
+进程内共享的 db engine（连接池）
+
+DbEngineRegistry.get(host, db, user, pwd) -> DbEngine
+    以 (host, db, user, pwd 的 hash, echo 及连接池参数) 为 key，同一进程内相同的连接设置只创建一个 engine，
+    各个 XxxDbManagement 实例之间共享，避免每次实例化都重新创建连接池、重新登录db；
+    pwd 或连接池参数不同时创建另外的 engine，不会拿到其他设置的 engine。
+
+DbEngine
+    .engine         sqlalchemy Engine
+    .DBSession      sessionmaker
+    .session()      with 语句中使用的 session，取连接时计时，退出时归还连接
+    .metrics        PoolMetrics，连接池的 新建连接 / checkout / checkin / 等待时间 统计
+
+连接池参数:
+    pool_pre_ping   取出连接时先 ping，db重启或网络断开后不会拿到失效连接
+    pool_recycle    连接使用超过一定时间后重建，避免被服务端/防火墙静默断开
+"""
+
+import hashlib
+import threading
+from time import perf_counter
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Tuple
+from urllib import parse
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, Session
+
+
+@dataclass
+class PoolMetrics:
+    connects: int = 0               # 新建的db连接数（TCP + login）
+    checkouts: int = 0              # 从连接池取出连接的次数
+    checkins: int = 0               # 归还连接池的次数
+    invalidated: int = 0            # 失效（被丢弃）的连接数
+    waits: int = 0                  # 经过计时的取连接次数
+    wait_seconds_total: float = 0   # 取连接的总等待时间
+    wait_seconds_max: float = 0     # 取连接的最长等待时间
+
+    @property
+    def wait_seconds_avg(self) -> float:
+        return self.wait_seconds_total / self.waits if self.waits else 0.
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d['wait_seconds_avg'] = self.wait_seconds_avg
+        return d
+
+
+class DbEngine:
+    def __init__(
+            self, db, host, user, pwd,
+            echo=False,
+            pool_size=5,            # 连接池的大小
+            max_overflow=10,        # 超过连接池大小之后，允许最大扩展连接数；
+            pool_timeout=30,        # 连接池如果没有连接了，最长的等待时间
+            pool_recycle=1800,      # 多久之后对连接池中连接进行一次回收
+    ):
+        self.engine = create_engine(
+            f'mssql+pymssql://{str(user)}:{parse.quote_plus(pwd)}@{str(host)}/{str(db)}',
+            echo=echo,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=True,
+        )
+        # 创建DBSession类
+        self.DBSession = sessionmaker(bind=self.engine)
+
+        self.metrics = PoolMetrics()
+        self._metrics_lock = threading.Lock()
+        event.listen(self.engine, 'connect', self._on_connect)
+        event.listen(self.engine, 'checkout', self._on_checkout)
+        event.listen(self.engine, 'checkin', self._on_checkin)
+        event.listen(self.engine, 'invalidate', self._on_invalidate)
+
+    def _on_connect(self, *args):
+        with self._metrics_lock:
+            self.metrics.connects += 1
+
+    def _on_checkout(self, *args):
+        with self._metrics_lock:
+            self.metrics.checkouts += 1
+
+    def _on_checkin(self, *args):
+        with self._metrics_lock:
+            self.metrics.checkins += 1
+
+    def _on_invalidate(self, *args):
+        with self._metrics_lock:
+            self.metrics.invalidated += 1
+
+    def connect(self):
+        """ 从连接池取出连接，并统计等待时间 """
+        _t_start = perf_counter()
+        conn = self.engine.connect()
+        _wait = perf_counter() - _t_start
+        with self._metrics_lock:
+            self.metrics.waits += 1
+            self.metrics.wait_seconds_total += _wait
+            self.metrics.wait_seconds_max = max(self.metrics.wait_seconds_max, _wait)
+        return conn
+
+    @contextmanager
+    def session(self) -> Session:
+        conn = self.connect()
+        session: Session = self.DBSession(bind=conn)
+        try:
+            yield session
+        finally:
+            session.close()
+            conn.close()
+
+    def pool_status(self) -> dict:
+        d = self.metrics.to_dict()
+        d['checked_out'] = self.engine.pool.checkedout()
+        d['pool_size'] = self.engine.pool.size()
+        return d
+
+    def dispose(self):
+        self.engine.dispose()
+
+
+class DbEngineRegistry:
+    # {(host, db, user, pwd hash, settings): DbEngine}
+    _engines: Dict[tuple, DbEngine] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _key(db, host, user, pwd, echo, kwargs: dict) -> tuple:
+        pwd_hash = hashlib.sha256(str(pwd).encode('utf-8')).hexdigest()
+        settings = tuple(sorted(dict(kwargs, echo=echo).items()))
+        return str(host), str(db), str(user), pwd_hash, settings
+
+    @classmethod
+    def get(cls, db, host, user, pwd, echo=False, **kwargs) -> DbEngine:
+        key = cls._key(db=db, host=host, user=user, pwd=pwd, echo=echo, kwargs=kwargs)
+        with cls._lock:
+            if key not in cls._engines:
+                cls._engines[key] = DbEngine(db=db, host=host, user=user, pwd=pwd, echo=echo, **kwargs)
+            return cls._engines[key]
+
+    @classmethod
+    def metrics(cls) -> Dict[Tuple[str, str, str, str], dict]:
+        """ {(host, db, user, pwd hash 前8位): pool_status} """
+        with cls._lock:
+            return {key[:3] + (key[3][:8], ): _engine.pool_status() for key, _engine in cls._engines.items()}
+
+    @classmethod
+    def dispose_all(cls):
+        with cls._lock:
+            for _engine in cls._engines.values():
+                _engine.dispose()
+            cls._engines.clear()
+
+
+def get_db_engine(db, host, user, pwd, echo=False, **kwargs) -> DbEngine:
+    return DbEngineRegistry.get(db=db, host=host, user=user, pwd=pwd, echo=echo, **kwargs)
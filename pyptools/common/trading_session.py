@@ -1,5 +1,5 @@
 """
-TradingSessionData: [Date, Product, TradingSession, ExchangeTimezone]
+TradingSessionData: [Date, Product, TradingSession, ExchangeTimezone, NightSession]
 TradingSessionFile.read() -> Dict[(Product, date), TradingSessionData]
 
 TradingSessionManager.data -> Dict[{_time_zone_index}, Dict[(Product, date), TradingSessionData]]
@@ -7,7 +7,7 @@ TradingSessionManager.data -> Dict[{_time_zone_index}, Dict[(Product, date), Tra
 
 import os
 from datetime import date, time, datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Dict, List
 from .object import Product
 from collections import defaultdict
@@ -17,8 +17,9 @@ from collections import defaultdict
 class TradingSessionData:
     Date: date              # 信息日期
     Product: Product
-    TradingSession: List[List[time]]        #
+    TradingSession: List[List[time]]        # 日盘
     ExchangeTimezone: str           # 交易所所在时区，很少情况需要用到，所以作废（乱填）
+    NightSession: List[List[time]] = field(default_factory=list)       # 夜盘，没有夜盘时为空
 
 
 class TradingSessionDataSet:
@@ -26,24 +27,36 @@ class TradingSessionDataSet:
         self._data: Dict[Product, List[TradingSessionData]] = data
 
     def get(self, product: Product, checking_date=datetime.today().date()) -> List[List[time]] or None:
+        _ts = self.get_data(product, checking_date)
+        return _ts.TradingSession if _ts else None
+
+    def get_data(self, product: Product, checking_date: date or None = None) -> TradingSessionData or None:
+        """ checking_date 当天有效的（Date 不晚于 checking_date 的最新一条）交易时间数据 """
+        checking_date = checking_date or datetime.today().date()
         _product_ts_list: List[TradingSessionData] or None = self._data.get(product)
         if not _product_ts_list:
             return None
         else:
             if len(_product_ts_list) == 1:
-                return _product_ts_list[0].TradingSession
+                return _product_ts_list[0]
             else:
                 _nearest_ts = [_ts for _ts in _product_ts_list if _ts.Date <= checking_date]
                 if _nearest_ts:
-                    return max(_nearest_ts, key=lambda x: x.Date).TradingSession
+                    return max(_nearest_ts, key=lambda x: x.Date)
                 else:
-                    return min(_product_ts_list, key=lambda x: x.Date).TradingSession
+                    return min(_product_ts_list, key=lambda x: x.Date)
+
+    @property
+    def products(self) -> List[Product]:
+        return list(self._data.keys())
 
 
 def _gen_trading_session(s) -> List[List[time]]:
     """ str to trading-session-data-list"""
     _l = []
     for _pair in s.split('&'):
+        if not _pair.strip():
+            continue
         _s = datetime.strptime(_pair.split('-')[0], '%H%M%S').time()
         _e = datetime.strptime(_pair.split('-')[1], '%H%M%S').time()
         _l.append([_s, _e])
@@ -77,7 +90,8 @@ class TradingSessionFile:
                 Date=_start_date,
                 Product=_product,
                 TradingSession=_gen_trading_session(_line_split[2]),
-                ExchangeTimezone=_line_split[4]
+                ExchangeTimezone=_line_split[4],
+                NightSession=_gen_trading_session(_line_split[3]),
             )
             d_trading_session[_product].append(_trading_session_data)
         return TradingSessionDataSet(d_trading_session)
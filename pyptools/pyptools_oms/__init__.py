@@ -1,2 +1,4 @@
 from .db import OmsDbManagement, Order, OrderLogs, Trade, TradeLogs, TraderPosition
+from .db import POSITION_COLUMNS
 from .db import OrderState, Direction
+from .position_book import PositionBook
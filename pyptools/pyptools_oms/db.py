@@ -2,17 +2,21 @@
 
 """
 
-from urllib import parse
 from typing import Dict, List
 from collections import defaultdict
 from enum import Enum
 from datetime import datetime, date
 import os
+import csv
 
-from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, DateTime
-from sqlalchemy import create_engine, desc
+import numpy as np
+from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, DateTime, Index
+from sqlalchemy import desc, select
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship
+
+from ..common.db_engine import DbEngine, get_db_engine
+from ..common.common_util import atomic_open
 
 
 class OrderState(Enum):
@@ -114,6 +118,11 @@ class OrderLogs(Base):  # 定义一个类，继承Base
     BatchId = Column(String(64))
     IsBatchOrder = Column(String(64))
 
+    # 按时间倒序分页查询 / 按时间顺序导出 时使用的索引，仅作说明；表属于 OMS，本工具只读，不在db中创建
+    __table_args__ = (
+        Index('IX_OrderBookLogs_CreateTime', 'CreateTime'),
+    )
+
     def __repr__(self):
         # return f'<Order(InternalId={self.InternalId}, ExternalId={self.ExternalId}, ' \
         #        f'Account={self.Account}, Trader={self.Trader}, ' \
@@ -179,6 +188,11 @@ class TradeLogs(Base):  # 定义一个类，继承Base
     BatchId = Column(String(64))
     CommissionAsset = Column(String(64))
 
+    # 按时间倒序分页查询 / 按时间顺序导出 时使用的索引，仅作说明；表属于 OMS，本工具只读，不在db中创建
+    __table_args__ = (
+        Index('IX_TradeBookLogs_CreateTime', 'CreateTime'),
+    )
+
     def __str__(self):
         return str(self.to_dict())
 
@@ -209,51 +223,168 @@ class TraderPosition(Base):  # 定义一个类，继承Base
         return f'<TraderPosition, {str(self.to_dict())}>'
 
 
+# 轮询持仓时需要的列
+POSITION_COLUMNS = ['Trader', 'Ticker', 'LongVolume', 'ShortVolume', 'LongPrice', 'ShortPrice', 'UpdateTime']
+
+
+def _column_dtype(column: Column):
+    if isinstance(column.type, (Float, Integer)):
+        return 'f8'
+    elif isinstance(column.type, DateTime):
+        return 'datetime64[us]'
+    else:
+        return 'O'
+
+
+def rows_to_array(model, columns: List[str], rows: List[tuple]) -> np.ndarray:
+    """ 查询结果 -> NumPy structured array; 数值列的 NULL 转为 nan, 时间列的 NULL 转为 NaT """
+    l_dtypes = [(_name, _column_dtype(model.__table__.c[_name])) for _name in columns]
+    l_is_num = [_dtype == 'f8' for _, _dtype in l_dtypes]
+    l_rows = [
+        tuple(np.nan if (_v is None and _is_num) else _v for _v, _is_num in zip(_row, l_is_num))
+        for _row in rows
+    ]
+    return np.array(l_rows, dtype=l_dtypes)
+
+
 class OmsDbManagement:
+    """
+    每次查询使用独立的 session，查询结束即关闭 session、归还连接:
+        query_* 返回的 ORM 对象已与 session 分离（detached），查询时加载的列可以直接读取，
+        但不能再延迟加载（lazy load）其他属性，也不能修改后提交；
+        iter_* 只在迭代过程中持有 session，迭代结束（或生成器被关闭）后归还连接；
+        close() 不需要再关闭 session，保留以兼容旧的调用方式。
+    """
     def __init__(self, db, host, user, pwd, echo=False):
-        # 初始化数据库连接
-        # self.PMSession = PMDbGlobal(db=db, host=host, user=user, pwd=pwd, echo=echo)
-        # 初始化数据库连接
-        self.engine = create_engine(
-            f'mssql+pymssql://{str(user)}:{parse.quote_plus(pwd)}@{str(host)}/{str(db)}',
-            echo=echo,
-            max_overflow=50,    # 超过连接池大小之后，允许最大扩展连接数；
-            pool_size=50,    # 连接池的大小
-            pool_timeout=600,   # 连接池如果没有连接了，最长的等待时间
-            pool_recycle=-1,    # 多久之后对连接池中连接进行一次回收
-        )
-        # 创建DBSession类
-        self.DBSession = sessionmaker(bind=self.engine)
-        self.session = self.DBSession()
+        # 初始化数据库连接, 同一进程内 连接设置相同的实例共享 engine（连接池）
+        self.db_engine: DbEngine = get_db_engine(db=db, host=host, user=user, pwd=pwd, echo=echo)
+        self.engine = self.db_engine.engine
+        # DBSession类
+        self.DBSession = self.db_engine.DBSession
 
     def close(self):
-        self.session.close()
+        # 每次查询使用独立的 session，查询结束即归还连接，无需关闭
+        pass
 
     def query_orders(self) -> List[Order]:
-        return self.session.query(Order).all()
-
-    def query_order_logs(self, n=1000):
-        return self.session.query(OrderLogs).order_by(desc(OrderLogs.CreateTime,))[:n-1]
+        with self.db_engine.session() as session:
+            return session.query(Order).all()
+
+    def _query_logs(self, model, n, offset) -> list:
+        # 在db中分页: TOP n / OFFSET offset ROWS FETCH NEXT n ROWS ONLY
+        with self.db_engine.session() as session:
+            query = session.query(model).order_by(desc(model.CreateTime,))
+            if offset:
+                query = query.offset(offset)
+            return query.limit(n).all()
+
+    def _iter_logs(self, model, start: datetime or None, end: datetime or None, batch_size):
+        # 按 CreateTime 顺序，分批读取，内存占用与数据总量无关
+        with self.db_engine.session() as session:
+            query = session.query(model)
+            if start is not None:
+                query = query.filter(model.CreateTime >= start)
+            if end is not None:
+                query = query.filter(model.CreateTime < end)
+            query = query.order_by(model.CreateTime).execution_options(stream_results=True).yield_per(batch_size)
+            for _data in query:
+                yield _data
+
+    def query_order_logs(self, n=1000, offset=0) -> List[OrderLogs]:
+        """ 按 CreateTime 倒序，跳过 offset 条后的 n 条 """
+        return self._query_logs(OrderLogs, n=n, offset=offset)
+
+    def iter_order_logs(self, start: datetime or None = None, end: datetime or None = None, batch_size=1000):
+        """ 按 CreateTime 顺序 流式读取 [start, end) 的 OrderLogs """
+        return self._iter_logs(OrderLogs, start=start, end=end, batch_size=batch_size)
 
     def query_trades(self):
-        return self.session.query(Trade).all()
+        with self.db_engine.session() as session:
+            return session.query(Trade).all()
+
+    def query_trade_logs(self, n=1000, offset=0) -> List[TradeLogs]:
+        """ 按 CreateTime 倒序，跳过 offset 条后的 n 条 """
+        return self._query_logs(TradeLogs, n=n, offset=offset)
 
-    def query_trade_logs(self, n=1000):
-        return self.session.query(TradeLogs).order_by(desc(TradeLogs.CreateTime,))[:n-1]
+    def iter_trade_logs(self, start: datetime or None = None, end: datetime or None = None, batch_size=1000):
+        """ 按 CreateTime 顺序 流式读取 [start, end) 的 TradeLogs """
+        return self._iter_logs(TradeLogs, start=start, end=end, batch_size=batch_size)
 
     def query_positions(self):
-        return self.session.query(TraderPosition).all()
+        with self.db_engine.session() as session:
+            return session.query(TraderPosition).all()
+
+    def query_columns(self, model, columns: List[str], where=None, as_array=False) -> List[tuple] or np.ndarray:
+        """
+        只查询需要的列，不经过 ORM（不创建对象、没有 identity map），返回 tuple 列表 或 NumPy structured array
+        :param model: Order / OrderLogs / Trade / TradeLogs / TraderPosition
+        :param columns: 列名
+        :param where: 过滤条件, 如 TraderPosition.UpdateTime >= dt
+        :param as_array: True 返回 NumPy structured array
+        """
+        _table = model.__table__
+        stmt = select(*[_table.c[_name] for _name in columns])
+        if where is not None:
+            stmt = stmt.where(where)
+        with self.db_engine.connect() as conn:
+            rows = [tuple(_row) for _row in conn.execute(stmt)]
+        if as_array:
+            return rows_to_array(model, columns, rows)
+        return rows
+
+    def query_positions_columns(self, update_time: datetime or None = None, as_array=False) -> List[tuple] or np.ndarray:
+        """
+        持仓轮询使用, 列顺序同 POSITION_COLUMNS
+        :param update_time: 不为空时，只查询 UpdateTime >= update_time 的持仓
+        """
+        where = None
+        if update_time is not None:
+            where = TraderPosition.UpdateTime >= update_time
+        return self.query_columns(TraderPosition, POSITION_COLUMNS, where=where, as_array=as_array)
+
+    def export_to_csv(
+            self, output, model,
+            start: datetime or None = None, end: datetime or None = None,
+            compress=False, chunk_size=5000,
+    ) -> int:
+        """
+        流式导出 [start, end) 的数据到csv，内存占用与数据量无关
+            在db中 ORDER BY CreateTime，分批 fetchmany，经 csv.writer 逐批写入临时文件，完成后替换 output
+        :param model: Order / OrderLogs / Trade / TradeLogs / TraderPosition
+        :param compress: gzip 压缩
+        :return: 导出的行数
+        """
+        _table = model.__table__
+        stmt = select(_table)
+        if start is not None:
+            stmt = stmt.where(_table.c.CreateTime >= start)
+        if end is not None:
+            stmt = stmt.where(_table.c.CreateTime < end)
+        stmt = stmt.order_by(_table.c.CreateTime)
+
+        n = 0
+        with atomic_open(output, 'w', encoding='utf-8', newline='', compress=compress) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(_table.columns.keys())
+            with self.db_engine.connect() as conn:
+                result = conn.execution_options(stream_results=True).execute(stmt)
+                while True:
+                    rows = result.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    writer.writerows([str(v) for v in _row] for _row in rows)
+                    n += len(rows)
+        return n
 
     @staticmethod
     def data_to_csv(output, data: List[Order] or List[OrderLogs] or List[Trade] or List[TradeLogs or List[TraderPosition]]):
-        if not os.path.isdir(os.path.dirname(output)):
-            os.makedirs(os.path.dirname(output))
-        s_output = ''
-        if len(data) > 0:
-            data: List[dict] = [_.to_dict() for _ in data]
-            data.sort(key=lambda x: x['CreateTime'])
-            s_output += '\n'.join([','.join(
-                [str(v) for v in list(_.values())]) for _ in data])
-            s_output = ','.join(list(data[0].keys())) + '\n' + s_output
-        with open(output, 'w', encoding='utf-8') as f:
-            f.writelines(s_output)
+        """ 已查询得到的数据 输出到csv，按 CreateTime 排序; 数据量大时使用 export_to_csv """
+        with atomic_open(output, 'w', encoding='utf-8', newline='') as f:
+            if len(data) > 0:
+                writer = csv.writer(f, lineterminator='\n')
+                l_columns = data[0].__table__.columns.keys()
+                writer.writerow(l_columns)
+                writer.writerows(
+                    [str(getattr(_, _column, None)) for _column in l_columns]
+                    for _ in sorted(data, key=lambda x: x.CreateTime)
+                )
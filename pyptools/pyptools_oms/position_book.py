@@ -0,0 +1,59 @@
+"""
+内存中的持仓簿
+
+PositionBook 以 (Trader, Ticker) 为 key 保存一个 oms db 的全部持仓，
+记录已读取到的最大 UpdateTime（watermark），
+每次 sync() 只查询 UpdateTime >= watermark 的持仓并更新到持仓簿中；
+每隔 reconcile_interval 秒重新读取一次全部持仓，用于剔除db中已被删除的持仓，并校正可能遗漏的更新。
+"""
+
+from time import monotonic
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from .db import OmsDbManagement, POSITION_COLUMNS
+
+
+class PositionBook:
+    def __init__(self, oms_db: OmsDbManagement, reconcile_interval=300):
+        self._oms_db = oms_db
+        self._reconcile_interval = reconcile_interval
+
+        self._positions: Dict[Tuple[str, str], dict] = {}
+        self.watermark: datetime or None = None
+        self._last_reconcile_time: float or None = None
+
+    @property
+    def positions(self) -> List[dict]:
+        return list(self._positions.values())
+
+    def _need_reconcile(self) -> bool:
+        if self.watermark is None or self._last_reconcile_time is None:
+            return True
+        return monotonic() - self._last_reconcile_time >= self._reconcile_interval
+
+    def _apply(self, l_position: List[dict]):
+        for _p in l_position:
+            self._positions[(_p['Trader'], _p['Ticker'])] = _p
+            _update_time = _p['UpdateTime']
+            if _update_time and (self.watermark is None or _update_time > self.watermark):
+                self.watermark = _update_time
+
+    def reconcile(self):
+        """ 全量读取，重建持仓簿 """
+        l_position = [dict(zip(POSITION_COLUMNS, _row)) for _row in self._oms_db.query_positions_columns()]
+        self._positions = {}
+        self.watermark = None
+        self._apply(l_position)
+        self._last_reconcile_time = monotonic()
+
+    def sync(self) -> List[dict]:
+        if self._need_reconcile():
+            self.reconcile()
+        else:
+            # UpdateTime 与 watermark 相同的持仓会被重复读取，更新是幂等的
+            self._apply([
+                dict(zip(POSITION_COLUMNS, _row))
+                for _row in self._oms_db.query_positions_columns(update_time=self.watermark)
+            ])
+        return self.positions
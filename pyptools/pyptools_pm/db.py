@@ -13,15 +13,15 @@
         https://www.cnblogs.com/kaichenkai/p/11088144.html
 '''
 
-from urllib import parse
 from typing import Dict, List
 from collections import defaultdict
 from datetime import datetime, date
 
 from sqlalchemy import Column, String, Integer, Date, Float, ForeignKey, DateTime
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship
+
+from ..common.db_engine import DbEngine, get_db_engine
 
 Base = declarative_base()  # 创建对象的基类
 
@@ -137,33 +137,38 @@ class TraderLog(Base):
 
 
 class PMDbManagement:
+    """
+    每次查询使用独立的 session，查询结束即关闭 session、归还连接:
+        query_* 返回的 ORM 对象已与 session 分离（detached），查询时加载的列可以直接读取，
+        relationship（Trader.Strategy, Strategy.traders, TraderLog.Trader, Trader.logs）不能再延迟加载，
+        访问时 raise DetachedInstanceError，需要关联的数据时在查询中 join 或分别查询；
+        close() 不需要再关闭 session，保留以兼容旧的调用方式。
+    """
     def __init__(self, db, host, user, pwd, echo=False):
         # 初始化数据库连接
         # self.PMSession = PMDbGlobal(db=db, host=host, user=user, pwd=pwd, echo=echo)
         # 初始化数据库连接
-        self.engine = create_engine(
-            f'mssql+pymssql://{str(user)}:{parse.quote_plus(pwd)}@{str(host)}/{str(db)}',
-            echo=echo,
-            max_overflow=50,    # 超过连接池大小之后，允许最大扩展连接数；
-            pool_size=50,    # 连接池的大小
-            pool_timeout=600,   # 连接池如果没有连接了，最长的等待时间
-            pool_recycle=-1,    # 多久之后对连接池中连接进行一次回收
-        )
-        # 创建DBSession类
-        self.DBSession = sessionmaker(bind=self.engine)
-        self.session = self.DBSession()
+        # 同一进程内 连接设置相同的实例共享 engine（连接池）
+        self.db_engine: DbEngine = get_db_engine(db=db, host=host, user=user, pwd=pwd, echo=echo)
+        self.engine = self.db_engine.engine
+        # DBSession类
+        self.DBSession = self.db_engine.DBSession
 
     def close(self):
-        self.session.close()
+        # 每次查询使用独立的 session，查询结束即归还连接，无需关闭
+        pass
 
     def query_all_strategy(self) -> List[Strategy]:
-        return self.session.query(Strategy).all()
+        with self.db_engine.session() as session:
+            return session.query(Strategy).all()
 
     def query_all_trader(self) -> List[Trader]:
-        return self.session.query(Trader).order_by(Trader.Id).all()
+        with self.db_engine.session() as session:
+            return session.query(Trader).order_by(Trader.Id).all()
 
     def query_trader_pnls(self, trader_id,) -> List[TraderLog]:
-        return self.session.query(TraderLog).filter(TraderLog.TraderId == trader_id).order_by(TraderLog.Date).all()
+        with self.db_engine.session() as session:
+            return session.query(TraderLog).filter(TraderLog.TraderId == trader_id).order_by(TraderLog.Date).all()
 
     def query_strategy_traders_pnls(self, strategy_id,) -> Dict[str, Dict[str, List[TraderLog]]]:
         """
@@ -171,8 +176,9 @@ class PMDbManagement:
         """
         _d = defaultdict(dict)
         _d[strategy_id] = defaultdict(list)
-        _: List[TraderLog] = self.session.query(TraderLog).join(Trader).filter(
-            Trader.StrategyId == strategy_id).order_by(TraderLog.Date).all()
+        with self.db_engine.session() as session:
+            _: List[TraderLog] = session.query(TraderLog).join(Trader).filter(
+                Trader.StrategyId == strategy_id).order_by(TraderLog.Date).all()
         for _data in _:
             trader_name = _data.TraderId
             _d[strategy_id][trader_name].append(_data)
@@ -184,8 +190,9 @@ class PMDbManagement:
         """
         _d = defaultdict(dict)
         _d[strategy_id] = defaultdict(list)
-        _datas: List[list] = self.session.query(TraderLog.Date, TraderLog.TraderId).join(Trader).filter(
-            Trader.StrategyId == strategy_id).all()
+        with self.db_engine.session() as session:
+            _datas: List[list] = session.query(TraderLog.Date, TraderLog.TraderId).join(Trader).filter(
+                Trader.StrategyId == strategy_id).all()
         for _data in _datas:
             _date: date = datetime.strptime(_data[0], '%Y%m%d').date()
             _trader_name = _data[1]
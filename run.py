@@ -8,6 +8,7 @@ from time import sleep
 from datetime import datetime, date, time
 import argparse
 import threading
+import asyncio
 
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
@@ -19,7 +20,10 @@ from RtdMonitor.rtdmonitor import (
     RtdCommonPlotter, RtdSingleFileDataHandler
 )
 from helper.scheduler import ScheduleRunner
+from helper.trading_calendar import TradingCalendar
+from helper.pipeline import PipelineExecutor, PipelineStage
 from helper.simpleLogger import MyLogger
+from collector import PositionCollector
 
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
@@ -31,11 +35,16 @@ class MyScheduler(ScheduleRunner):
             running_time: list,  # ScheduleRunner
             interval=300,
             logger=MyLogger('RtdMonitor'),
+            collector: PositionCollector or None = None,     # 为空时，沿用调用 bat 的方式
+            session_provider=None,
     ):
         # 定时任务骑
-        super(MyScheduler, self).__init__(running_time=running_time, logger=logger, schedule_checking_interval=interval)
+        super(MyScheduler, self).__init__(
+            running_time=running_time, logger=logger, schedule_checking_interval=interval,
+            session_provider=session_provider)
         self._task_interval = interval
         self._task_processing_thread: None or threading.Thread = None
+        self._collector = collector
 
     def _start_task(self):
         self._task_processing_thread = threading.Thread(target=self._task_processing_loop)
@@ -48,24 +57,66 @@ class MyScheduler(ScheduleRunner):
         self.logger.info('线程已终止!')
 
     def _task_processing_loop(self):
-        p_1_get_position_bat = os.path.join(PATH_ROOT, '_1.GetTraderPosition.bat')
-        p_2_get_initx = os.path.join(PATH_ROOT, '_2.GetTraderInitX.bat')
-        p_3_cal = os.path.join(PATH_ROOT, '_3.GenPerInitXPosition.AIO.bat')
-        p_4_cal = os.path.join(PATH_ROOT, '_3.GenPerInitXPosition.Selected.bat')
-
-        l_bat = [p_1_get_position_bat, p_2_get_initx, p_3_cal, p_4_cal]
+        if self._collector:
+            # 常驻收集器，在本线程的 event loop 中运行
+            asyncio.run(self._collector.run(self._task_interval, lambda: self.schedule_in_running, wait=self.wait))
+            return
+
+        # 1 / 2 并发，完成后再计算 3；等待每个 bat 结束，记录耗时和 exit code
+        # 上一个循环未结束时，不重叠运行，合并到上一个循环结束后
+        pipeline = PipelineExecutor([
+            PipelineStage.bat('position', os.path.join(PATH_ROOT, '_1.GetTraderPosition.bat')),
+            PipelineStage.bat('initx', os.path.join(PATH_ROOT, '_2.GetTraderInitX.bat')),
+            PipelineStage.bat(
+                'per_initx_aio', os.path.join(PATH_ROOT, '_3.GenPerInitXPosition.AIO.bat'),
+                depends_on=['position', 'initx']),
+            PipelineStage.bat(
+                'per_initx_selected', os.path.join(PATH_ROOT, '_3.GenPerInitXPosition.Selected.bat'),
+                depends_on=['position', 'initx']),
+        ], logger=self.logger)
 
         while self.schedule_in_running:
-            for _bat in l_bat:
-                self.logger.info(f'calling {_bat}')
-                os.popen(f'call {_bat}')
-            sleep(self._task_interval)
+            pipeline.submit()
+            self.wait(self._task_interval)
+        pipeline.close()
 
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--bat', action='store_true', help='每个循环调用bat更新数据，而不使用常驻收集器')
+    arg_parser.add_argument('--trading_session', default='', help='TradingSession.csv, 与 --holiday 一起使用时按交易时间运行')
+    arg_parser.add_argument('--holiday', default='', help='Holiday.csv')
+    arg_parser.add_argument('--no_selected', action='store_true', help='不显示 Selected（单独运行 run_selected.py 时）')
+    arg_parser.add_argument('--headless', action='store_true', help='不打开窗口，渲染成图片')
+    arg_parser.add_argument('--output_dir', default='', help='headless, 图片和数据的输出文件夹')
+    arg_parser.add_argument('--http_port', type=int, default=None, help='headless, 在本地端口提供最新的图片和数据')
+    args = arg_parser.parse_args()
+
     my_logger = MyLogger('rtd plotter')
 
-    # 运行bat 更新数据 =========================
+    # 运行时间: 交易日历（各品种交易时间的并集，跳过假期）, 或固定的时间区间
+    session_provider = None
+    if args.trading_session and args.holiday:
+        session_provider = TradingCalendar.from_files(
+            path_trading_session=args.trading_session,
+            path_holiday=args.holiday,
+            path_ticker_info=os.path.join(PATH_ROOT, 'Config', 'GeneralTickerInfo.csv'),
+        ).sessions_on
+
+    # 更新数据 =========================
+    collector = None
+    if not args.bat:
+        collector = PositionCollector(
+            path_oms_db_info=os.path.join(PATH_ROOT, 'Config', 'OmsDBInfo.csv'),
+            path_qm_db_info=os.path.join(PATH_ROOT, 'Config', 'QMReportDBInfo.csv'),
+            path_ticker_info=os.path.join(PATH_ROOT, 'Config', 'GeneralTickerInfo.csv'),
+            d_white_list={
+                'AIO': os.path.join(PATH_ROOT, 'Config', 'WhiteListTrader.AIO.txt'),
+                'Selected': os.path.join(PATH_ROOT, 'Config', 'WhiteListTrader.Selected.txt'),
+            },
+            output_root=PATH_ROOT,
+            logger=my_logger,
+        )
     bat_scheduler = MyScheduler(
         running_time=[
             [time(9, 0, 0), time(11, 32, 0)],
@@ -73,12 +124,15 @@ if __name__ == '__main__':
             [time(21, 0, 0), time(23, 2, 0)],
         ],
         interval=15,
-        logger=my_logger
+        logger=my_logger,
+        collector=collector,
+        session_provider=session_provider,
     )
     bat_scheduler.start()
     sleep(1)
 
-    # AIO 画图 ===================
+    # 画图 ===================
+    # AIO / Selected 在同一个 engine 中，共用一个定时任务线程
     engine = RtdMonitorEngine(
         running_time=[
             [time(9, 0, 0), time(11, 32, 0)],
@@ -87,18 +141,37 @@ if __name__ == '__main__':
         ],
         rtd_task_interval=5,
         refresh_data_in_task_start=True,
-        logger=my_logger
-    )
-    plotter = RtdCommonPlotter(
-        engine,
-        1, 1, 'Position_AIO',
-        sort_by_column_name='ShengShi23'
+        logger=my_logger,
+        headless=args.headless,
+        output_dir=args.output_dir,
+        http_port=args.http_port,
+        session_provider=session_provider,
     )
-    handler = RtdSingleFileDataHandler(
-        engine,
-        file_path=os.path.join(PATH_ROOT, r'_Output_3_PositionPInitX\data.AIO.csv'),
-        all_in_one_ax_name='AIO'
+    # AIO
+    engine.add_view(
+        RtdSingleFileDataHandler(
+            engine,
+            file_path=os.path.join(PATH_ROOT, r'_Output_3_PositionPInitX\data.AIO.csv'),
+            all_in_one_ax_name='AIO'
+        ),
+        RtdCommonPlotter(
+            engine,
+            1, 1, 'Position_AIO',
+            sort_by_column_name='ShengShi23'
+        ),
     )
-    engine.add_plotter(plotter)
-    engine.add_data_handler(handler)
+    # Selected
+    if not args.no_selected:
+        engine.add_view(
+            RtdSingleFileDataHandler(
+                engine,
+                file_path=os.path.join(PATH_ROOT, r'_Output_3_PositionPInitX\data.Selected.csv'),
+                all_in_one_ax_name='Selected'
+            ),
+            RtdCommonPlotter(
+                engine,
+                1, 1, 'Position_Selected',
+                sort_by_column_name='ShengShi8'
+            ),
+        )
     engine.start()
\ No newline at end of file
@@ -7,7 +7,6 @@ import sys
 from time import sleep
 from datetime import datetime, date, time
 import argparse
-import threading
 
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
@@ -18,52 +17,30 @@ from RtdMonitor.rtdmonitor import (
     RtdTimeSeriesPlotter, RtdTimeSeriesDataHandler,
     RtdCommonPlotter, RtdSingleFileDataHandler
 )
-from helper.scheduler import ScheduleRunner
+from helper.trading_calendar import TradingCalendar
 from helper.simpleLogger import MyLogger
 
 
 PATH_ROOT = os.path.abspath(os.path.dirname(__file__))
 
 
-class MyScheduler(ScheduleRunner):
-    def __init__(
-            self,
-            running_time: list,  # ScheduleRunner
-            interval=300,
-            logger=MyLogger('RtdMonitor'),
-    ):
-        # 定时任务骑
-        super(MyScheduler, self).__init__(running_time=running_time, logger=logger, schedule_checking_interval=interval)
-        self._task_interval = interval
-        self._task_processing_thread: None or threading.Thread = None
-
-    def _start_task(self):
-        self._task_processing_thread = threading.Thread(target=self._task_processing_loop)
-        self._task_processing_thread.start()
-
-    def _end_task(self):
-        self.logger.info('正在等待线程结束...')
-        if self._task_processing_thread:
-            self._task_processing_thread.join()
-        self.logger.info('线程已终止!')
-
-    def _task_processing_loop(self):
-        p_1_get_position_bat = os.path.join(PATH_ROOT, '_1.GetTraderPosition.bat')
-        p_2_get_initx = os.path.join(PATH_ROOT, '_2.GetTraderInitX.bat')
-        p_3_cal = os.path.join(PATH_ROOT, '_3.GenPerInitXPosition.AIO.bat')
-
-        l_bat = [p_1_get_position_bat, p_2_get_initx, p_3_cal]
-
-        while self.schedule_in_running:
-            for _bat in l_bat:
-                self.logger.info(f'calling {_bat}')
-                os.popen(f'call {_bat}')
-            sleep(self._task_interval)
-
-
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--trading_session', default='', help='TradingSession.csv, 与 --holiday 一起使用时按交易时间运行')
+    arg_parser.add_argument('--holiday', default='', help='Holiday.csv')
+    args = arg_parser.parse_args()
+
     my_logger = MyLogger('rtd plotter_Selected')
 
+    # 运行时间: 交易日历（各品种交易时间的并集，跳过假期）, 或固定的时间区间
+    session_provider = None
+    if args.trading_session and args.holiday:
+        session_provider = TradingCalendar.from_files(
+            path_trading_session=args.trading_session,
+            path_holiday=args.holiday,
+            path_ticker_info=os.path.join(PATH_ROOT, 'Config', 'GeneralTickerInfo.csv'),
+        ).sessions_on
+
     # selected 画图 ===================
     engine = RtdMonitorEngine(
         running_time=[
@@ -73,7 +50,8 @@ if __name__ == '__main__':
         ],
         rtd_task_interval=5,
         refresh_data_in_task_start=True,
-        logger=my_logger
+        logger=my_logger,
+        session_provider=session_provider,
     )
     plotter = RtdCommonPlotter(
         engine,
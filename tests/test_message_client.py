@@ -0,0 +1,146 @@
+"""
+helper.PyMessageClient 的 exe 传输方式
+
+用一个 python 脚本代替 TradingPlatform.MessageClient.exe（需要可执行的 shebang 脚本，不在 windows 上运行）:
+    key 保存在 cwd 下 store/ 中，一个 key 一个文件；
+    key 以 slow 开头时 sleep 后再返回。
+"""
+
+import os
+import sys
+import time
+import logging
+
+import pytest
+
+PATH_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PATH_ROOT)
+
+from helper.PyMessageClient.constant import MCTask, RunException
+from helper.PyMessageClient.transport import MCRequest, MessageTransport, ExeTransport, gen_exe_args, parse_exe_output
+from helper.PyMessageClient.MessageClient import MessageClient
+
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason='stub exe is a shebang script')
+
+STUB_EXE = '''#!{python}
+import os, sys, time
+ip, port, task = sys.argv[1:4]
+args = sys.argv[4:]
+p_store = os.path.join(os.getcwd(), 'store')
+os.makedirs(p_store, exist_ok=True)
+if args and args[0].startswith('slow'):
+    time.sleep(float(args[0].split('_')[-1]))
+if task == 'sendmessage':
+    with open(os.path.join(p_store, args[0]), 'w', encoding='utf-8') as f:
+        f.write(args[1])
+    print('<< ok')
+elif task == 'getmessage':
+    p = os.path.join(p_store, args[0])
+    if not os.path.isfile(p):
+        print('System.Exception: key not found')
+    else:
+        with open(p, encoding='utf-8') as f:
+            print('<< ' + f.read())
+elif task == 'status':
+    print('<< ' + ' '.join(sys.argv[1:]))
+'''
+
+
+@pytest.fixture
+def path_mc(tmp_path):
+    p_exe = tmp_path / 'MessageClient'
+    p_exe.write_text(STUB_EXE.format(python=sys.executable), encoding='utf-8')
+    p_exe.chmod(0o755)
+    return tmp_path
+
+
+@pytest.fixture
+def transport(path_mc):
+    logger = logging.getLogger('test_message_client')
+    _transport = ExeTransport(
+        ip='127.0.0.1', port=12005, path_mc=str(path_mc), path_mc_exe=str(path_mc / 'MessageClient'),
+        logger=logger, max_workers=8)
+    yield _transport
+    _transport.close()
+
+
+@pytest.fixture
+def client(transport):
+    mc = MessageClient('127.0.0.1', 12005, logger=logging.getLogger('test_message_client'), transport=transport)
+    yield mc
+    mc.close()
+
+
+def test_gen_exe_args_keeps_empty_args():
+    assert gen_exe_args('x.exe', 'ip', 1, MCRequest(task=MCTask.SendMessage, key='k', arg='')) == \
+        ['x.exe', 'ip', '1', 'sendmessage', 'k', '']
+    assert gen_exe_args('x.exe', 'ip', 1, MCRequest(task=MCTask.GetMessage, key='k')) == \
+        ['x.exe', 'ip', '1', 'getmessage', 'k']
+    assert gen_exe_args('x.exe', 'ip', 1, MCRequest(task=MCTask.Status)) == ['x.exe', 'ip', '1', 'status']
+
+
+def test_parse_exe_output():
+    assert parse_exe_output('connecting\n>> getmessage k\n<< value \n').msg == 'value'
+    assert parse_exe_output('System.Exception: key not found').exception == RunException.Error
+
+
+def test_round_trip_without_shell_quoting(client):
+    message = 'a "quoted" & piped | 世界'
+    assert not client.sendmessage('k', message).exception
+    assert client.getmessage('k').msg == message
+    assert not client.sendmessage('empty', '').exception
+    assert client.getmessage('empty').msg == ''
+
+
+def test_missing_key_is_an_error(client):
+    assert client.getmessage('missing', max_try=1).exception == RunException.Error
+
+
+def test_timeout_kills_the_process(transport):
+    t_start = time.monotonic()
+    rtn_data = transport.run([MCRequest(task=MCTask.GetMessage, key='slow_30')], timeout=1)[0]
+    assert rtn_data.exception == RunException.TimeOut
+    assert time.monotonic() - t_start < 10
+
+
+def test_requests_run_concurrently_in_order(transport):
+    l_requests = [MCRequest(task=MCTask.SendMessage, key=f'slow_k{n}_1', arg=f'v{n}') for n in range(8)]
+    t_start = time.monotonic()
+    l_rtn = transport.run(l_requests, timeout=10)
+    assert time.monotonic() - t_start < 4
+    assert [_.exception for _ in l_rtn] == [None] * 8
+    l_rtn = transport.run([MCRequest(task=MCTask.GetMessage, key=_.key) for _ in l_requests], timeout=10)
+    assert [_.msg for _ in l_rtn] == [f'v{n}' for n in range(8)]
+
+
+class CountingTransport(MessageTransport):
+    def __init__(self, transport: MessageTransport):
+        self._transport = transport
+        self.l_keys = []
+
+    def run(self, l_requests, timeout):
+        self.l_keys += [_.key for _ in l_requests]
+        return self._transport.run(l_requests, timeout=timeout)
+
+
+def test_timestamp_lookup_honours_max_try(transport):
+    counting = CountingTransport(transport)
+    mc = MessageClient('127.0.0.1', 12005, logger=logging.getLogger('test_message_client'), transport=counting)
+    assert not mc.sendmessage('k', 'v').exception
+    counting.l_keys.clear()
+    assert mc.getmessage('k', max_try=1, with_timestamp_gap=60) is None
+    assert counting.l_keys == ['dt#k']
+
+    assert not mc.sendmessage('k', 'v', with_timestamp=True).exception
+    assert mc.getmessage('k', max_try=1, with_timestamp_gap=60).msg == 'v'
+
+
+def test_getmessages_concurrently_checks_timestamps(client):
+    assert not client.sendmessages_concurrently({'a': 'va', 'b': 'vb'}, with_timestamp=True)['a'].exception
+    assert not client.sendmessage('c', 'vc').exception
+    d_rtn = client.getmessages_concurrently(['a', 'b', 'c', 'a'], max_try=1, with_timestamp_gap=60)
+    assert list(d_rtn) == ['a', 'b', 'c']
+    assert [d_rtn['a'].msg, d_rtn['b'].msg] == ['va', 'vb']
+    assert d_rtn['c'].exception == RunException.Expired
+    assert client.getmessages_concurrently(['c'], max_try=1)['c'].msg == 'vc'